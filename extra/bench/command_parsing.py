@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Leon Jacobs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' Compare the old per-plugin command stripping with the tokenizer '''
+
+import timeit
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+
+from hogar.Utils import PluginLoader
+from hogar.Utils import StringUtils
+from hogar.Utils import Tokenizer
+
+# The commands of the packaged text plugins
+plugins = [
+    {'name': 'Echo', 'commands': ['echo', 'say']},
+    {'name': 'Imgur', 'commands': ['img', 'imgur']},
+    {'name': 'Insult', 'commands': ['insult']},
+    {'name': 'Joke', 'commands': ['joke']},
+    {'name': 'Learn', 'commands': ['learn', 'forget', 'show']},
+    {'name': 'Logger', 'commands': ['*']},
+    {'name': 'Ping', 'commands': ['ping']},
+    {'name': 'Reminders', 'commands': ['reminder', 'remind']},
+    {'name': 'UrbanDictionary', 'commands': ['whatis', 'urban']},
+    {'name': 'Whoami', 'commands': ['whoami']},
+]
+
+index, wildcard = PluginLoader.index_commands(plugins)
+
+def strip (text):
+    ''' The mention and '/' stripping every plugin used to repeat '''
+
+    if text.startswith('@'):
+        text = text.split(' ', 1)[1].strip()
+
+    if text.startswith('/'):
+        text = text.replace('/', '', 1).strip()
+
+    return text
+
+def old (text):
+    '''
+        Find the plugins for a message the way the response
+        handler used to, and let each of them strip the text
+        down to its arguments again.
+    '''
+
+    command = strip(text).split('@')[0].strip().split(' ')[0].lower()
+    matched = index.get(command, wildcard)
+
+    for plugin in matched:
+        args = strip(text)
+        for command in plugin['commands']:
+            args = StringUtils.ignore_case_replace(command, '', args).strip()
+
+    return matched
+
+def new (text):
+    ''' Tokenize the message once and share it with every plugin '''
+
+    tokens = Tokenizer.tokenize(text)
+    matched = index.get(tokens.command, wildcard)
+
+    for plugin in matched:
+        args = tokens.args
+
+    return matched
+
+messages = [
+    ('command', u'ping'),
+    ('slash and bot name', u'/echo@MrBot hello there, how are you?'),
+    ('mention', u'@MrBot remind set once tomorrow 4pm, book a flight'),
+    ('no command', u'just some chatter in a group that only the logger sees'),
+]
+
+if __name__ == '__main__':
+
+    number = 20000
+
+    print '{name:<20} {old:>16} {new:>16}'.format(
+        name = 'message', old = 'old (us)', new = 'tokenizer (us)')
+
+    for name, text in messages:
+
+        before = timeit.timeit(lambda: old(text), number = number) / number * 1e6
+        after = timeit.timeit(lambda: new(text), number = number) / number * 1e6
+
+        print '{name:<20} {old:>16.2f} {new:>16.2f}'.format(
+            name = name, old = before, new = after)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Leon Jacobs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' Compare the old Imgur rejection sampling with the candidate index '''
+
+import ConfigParser
+import tempfile
+import timeit
+import random
+import imp
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+
+plugin = imp.load_source('imgur_plugin', os.path.join(
+    os.path.dirname(__file__), '../../hogar/Plugins/Imgur/main.py'))
+
+# The old sampler read settings.ini on every attempt
+settings = tempfile.NamedTemporaryFile(suffix = '.ini', delete = False)
+settings.write('[imgur]\nnsfw = no\n')
+settings.close()
+
+def allow_nsfw ():
+    config = ConfigParser.ConfigParser()
+    config.read(settings.name)
+
+    return config.getboolean('imgur', 'nsfw')
+
+def rejection_sample (results):
+    ''' The sampler as it was before the candidate index '''
+
+    is_album = True
+    while is_album:
+
+        if allow_nsfw():
+            image_data = random.choice(results)
+        else:
+            nsfw = True
+            while nsfw:
+                image_data = random.choice(results)
+                if not image_data['nsfw']:
+                    nsfw = False
+
+        if not image_data['is_album']:
+            is_album = False
+
+    return image_data
+
+def results (size, valid, kind):
+    '''
+        Build search results of size entries of which only
+        valid are images that are safe for work. The rest
+        are albums or nsfw images, depending on kind.
+    '''
+
+    data = []
+
+    for i in range(size):
+        data.append({
+            'title': 'title {i}'.format(i = i),
+            'link': 'link {i}'.format(i = i),
+            'is_album': i >= valid and kind == 'albums',
+            'nsfw': i >= valid and kind == 'nsfw'
+        })
+
+    random.shuffle(data)
+
+    return data
+
+distributions = [
+    ('mixed', results(60, 30, 'albums')),
+    ('mostly albums', results(60, 1, 'albums')),
+    ('mostly nsfw', results(60, 1, 'nsfw')),
+    ('no valid entries', results(60, 0, 'nsfw')),
+]
+
+if __name__ == '__main__':
+
+    number = 200
+
+    print '{name:<20} {old:>16} {index:>16} {pick:>16}'.format(
+        name = 'distribution', old = 'rejection (us)', index = 'index (us)', pick = 'pick (us)')
+
+    for name, data in distributions:
+
+        entry = plugin._index(data)
+
+        index = timeit.timeit(lambda: plugin._index(data), number = number) / number * 1e6
+        pick = timeit.timeit(lambda: plugin._pick(entry, False), number = number) / number * 1e6
+
+        # The old sampler never returns without a valid entry
+        if entry['safe']:
+            old = '{0:.1f}'.format(
+                timeit.timeit(lambda: rejection_sample(data), number = number) / number * 1e6)
+        else:
+            old = 'never returns'
+
+        print '{name:<20} {old:>16} {index:>16.1f} {pick:>16.1f}'.format(
+            name = name, old = old, index = index, pick = pick)
+
+    os.unlink(settings.name)
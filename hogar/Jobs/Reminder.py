@@ -21,11 +21,14 @@
 # THE SOFTWARE.
 
 import traceback
-import json
+import threading
+import Queue
 from datetime import datetime
-from dateutil.rrule import rrulestr
 
 from hogar.Utils import Telegram
+from hogar.Utils import Settings
+from hogar.Utils import RRule
+from hogar.Models.Base import db
 from hogar.Models.RemindOnce import RemindOnce
 from hogar.Models.RemindRecurring import RemindRecurring
 
@@ -33,32 +36,121 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-def _get_sender_information (message):
-    '''
-        Get information about who sent a message.
+# SQLite before 3.32 allows at most 999 bound variables
+# per query. Every update binds the value it sets as well
+# as the ids, so one variable is kept for that value.
+chunk_variables = 999
 
-        #TODO:
-        #Copied from ResponseHandler. Move to a util
+def _get_sender_information (reminder):
+    '''
+        Get information about who set a reminder.
 
         --
+        @param  reminder:RemindOnce|RemindRecurring    The reminder being sent
+
         @return dict
     '''
 
-    # Parse the Json in the database
-    message = json.loads(message)
-
     sender_information = {
 
-        'id': message['chat']['id'],
-        'first_name': message['from']['first_name'],
-        'last_name': message['from']['last_name'] \
-            if 'last_name' in message['from'] else None,
-        'username': '@{u}'.format(u = message['from']['username']) \
-            if 'username' in message['from'] else None
+        'id': reminder.chat_id,
+        'first_name': reminder.from_first_name,
+        'last_name': reminder.from_last_name,
+        'username': '@{u}'.format(u = reminder.from_username) \
+            if reminder.from_username else None
     }
 
     return sender_information
 
+def _send_reminder (reminder):
+    '''
+        Send Reminder
+
+        Send a single reminder, logging any failure.
+
+        --
+        @param  reminder:RemindOnce|RemindRecurring    The reminder to send
+
+        @return bool
+    '''
+
+    try:
+
+        Telegram.send_message(
+            _get_sender_information(reminder),
+            'text',
+            reminder.message
+        )
+
+    except Exception:
+
+        logger.error('Failed to send reminder {id}: {e}'.format(
+            id = reminder.id, e = traceback.format_exc()))
+        return False
+
+    return True
+
+def _send_reminders (reminders):
+    '''
+        Send Reminders
+
+        Send reminders concurrently with a bounded number of
+        sender threads, configured with [reminder] senders.
+
+        --
+        @param  reminders:list  The reminders to send
+
+        @return list            The reminders that were sent
+    '''
+
+    senders = Settings.section('reminder').getint('senders', 8)
+
+    work = Queue.Queue()
+    for reminder in reminders:
+        work.put(reminder)
+
+    sent = []
+
+    def sender ():
+        while True:
+            try:
+                reminder = work.get_nowait()
+            except Queue.Empty:
+                return
+
+            if _send_reminder(reminder):
+                sent.append(reminder)
+
+    threads = [threading.Thread(target = sender)
+               for _ in range(min(senders, len(reminders)))]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    return sent
+
+def _chunks (ids):
+    '''
+        Chunks
+
+        Split ids into chunks that, together with the
+        value being set, fit in the bound variables of a
+        single query.
+
+        --
+        @param  ids:list    The ids to split
+
+        @return generator
+    '''
+
+    chunk_size = chunk_variables - 1
+
+    for i in range(0, len(ids), chunk_size):
+        yield ids[i:i + chunk_size]
+
 def run_remind_once ():
     '''
         Run Remind Once
@@ -73,22 +165,21 @@ def run_remind_once ():
 
     try:
 
-        for reminder in RemindOnce.select().where(RemindOnce.sent == 0,
-                                                  RemindOnce.time <= datetime.now()):
-            logger.debug('Sending one time reminder message with id {id}'.format(
-                id = reminder.id
-            ))
+        due = list(RemindOnce.select().where(RemindOnce.sent == 0,
+                                             RemindOnce.time <= datetime.now()))
+
+        if not due:
+            return
+
+        logger.debug('Sending {n} one time reminder messages'.format(n = len(due)))
 
-            # Send the actual reminder
-            Telegram.send_message(
-                _get_sender_information(reminder.orig_message),
-                'text',
-                reminder.message
-            )
+        # Send the actual reminders
+        sent = [reminder.id for reminder in _send_reminders(due)]
 
-            # Mark it as complete
-            reminder.sent = 1
-            reminder.save()
+        # Mark them as complete
+        with db.atomic():
+            for ids in _chunks(sent):
+                RemindOnce.update(sent = 1).where(RemindOnce.id << ids).execute()
 
     except Exception:
 
@@ -100,58 +191,100 @@ def run_remind_recurring ():
     '''
         Run Remind Recurring
 
-        Find and send all of the recurring reminders that are due
+        Find and send all of the recurring reminders that are due.
+        The next run of every reminder that is still active
+        is returned so that the scheduler may track it.
 
         --
-        @return void
+        @return dict
     '''
 
     logger.debug('Running Remind Recurring Job')
 
+    scheduled = {}
+
     try:
 
         # Get reminders have have not been marked as completed, as well as
-        # have their next_run date ready or not set
-        for reminder in RemindRecurring.select().where(RemindRecurring.sent == 0,
-                                                       ((RemindRecurring.next_run <= datetime.now()) | (
-                                                           RemindRecurring.next_run >> None))):
-
-            # If we know the next_run date, send the message. If
-            # we dont know the next_run, this will be skipped
-            # and only the next_run determined
-            if reminder.next_run is not None:
-                logger.debug('Sending recurring reminder message with id {id}'.format(
-                    id = reminder.id
-                ))
-
-                # Send the actual reminder
-                Telegram.send_message(
-                    _get_sender_information(reminder.orig_message),
-                    'text',
-                    reminder.message)
-
-            # Lets parse the rrules and update the next_run time for
-            # a message. We will use python-dateutil to help with
-            # determinig the next run based on the parsed RRULE
-            # relative from now.
-            next_run = rrulestr(reminder.rrules,
-                                dtstart = datetime.now()).after(datetime.now())
-
-            # If there is no next run, consider the
-            # schedule complete and mark it as
-            # sent
-            if not next_run:
-                reminder.sent = 1
-                reminder.save()
-
-                continue
-
-            # Save the next run
-            reminder.next_run = next_run
-            reminder.save()
+        # have their next_run date ready or not set. These are two
+        # queries so that each of them can use the (sent, next_run)
+        # index, which an OR would prevent
+        due = list(RemindRecurring.select().where(RemindRecurring.sent == 0,
+                                                  RemindRecurring.next_run <= datetime.now()))
+        unscheduled = list(RemindRecurring.select().where(RemindRecurring.sent == 0,
+                                                          RemindRecurring.next_run >> None))
+
+        if not due and not unscheduled:
+            return scheduled
+
+        # If we know the next_run date, send the message. Reminders
+        # without a next_run are not sent, and only have their
+        # next_run determined. Reminders that failed to send are
+        # left as they are so that they are tried again.
+        logger.debug('Sending {n} recurring reminder messages'.format(n = len(due)))
+        sent = _send_reminders(due)
+
+        # Lets determine the next_run time for each message. We will
+        # use python-dateutil to help with determinig the next run
+        # based on the cached RRULE relative from now. Reminders
+        # sharing a rule share their next run, so it is only
+        # determined once per rule. Reminders are grouped by
+        # their next run so that they may be updated in bulk.
+        now = datetime.now()
+        rule_runs = {}
+        next_runs = {}
+
+        for reminder in sent + unscheduled:
+            if reminder.rrules not in rule_runs:
+                rule_runs[reminder.rrules] = RRule.next_run(reminder.rrules, now)
+
+            next_runs.setdefault(rule_runs[reminder.rrules], []).append(reminder.id)
+
+        with db.atomic():
+            for next_run, reminder_ids in next_runs.items():
+                for ids in _chunks(reminder_ids):
+
+                    # If there is no next run, consider the
+                    # schedule complete and mark it as sent
+                    if not next_run:
+                        RemindRecurring.update(sent = 1).where(
+                            RemindRecurring.id << ids).execute()
+                        continue
+
+                    # Save the next run
+                    RemindRecurring.update(next_run = next_run).where(
+                        RemindRecurring.id << ids).execute()
+
+                if next_run:
+                    scheduled.update((reminder_id, next_run) for reminder_id in reminder_ids)
 
     except Exception, e:
 
         print traceback.format_exc()
 
-    return
+    return scheduled
+
+def pending ():
+    '''
+        Pending
+
+        Get the fire times of all of the reminders that
+        have not been sent yet. Recurring reminders without
+        a next run are due immediately so that one
+        may be determined.
+
+        --
+        @return list
+    '''
+
+    reminders = []
+
+    for reminder in RemindOnce.select(RemindOnce.id, RemindOnce.time).where(
+            RemindOnce.sent == 0):
+        reminders.append(('once', reminder.id, reminder.time))
+
+    for reminder in RemindRecurring.select(RemindRecurring.id, RemindRecurring.next_run).where(
+            RemindRecurring.sent == 0):
+        reminders.append(('recurring', reminder.id, reminder.next_run or datetime.now()))
+
+    return reminders
@@ -25,6 +25,18 @@ from hogar.Models.Base import BaseModel
 
 class RemindOnce(BaseModel):
     orig_message = CharField(null = True, max_length = 2500)
+
+    chat_id = IntegerField(null = True, index = True)
+    from_first_name = CharField(null = True, max_length = 250)
+    from_last_name = CharField(null = True, max_length = 250)
+    from_username = CharField(null = True, max_length = 250)
+
     time = DateTimeField()
     message = CharField(null = True, max_length = 2500)
     sent = IntegerField(default = 0)
+
+    class Meta:
+        # Due reminders are looked up by sent and time
+        indexes = (
+            (('sent', 'time'), False),
+        )
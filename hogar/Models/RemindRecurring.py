@@ -25,7 +25,19 @@ from hogar.Models.Base import BaseModel
 
 class RemindRecurring(BaseModel):
     orig_message = CharField(null = True, max_length = 2500)
+
+    chat_id = IntegerField(null = True, index = True)
+    from_first_name = CharField(null = True, max_length = 250)
+    from_last_name = CharField(null = True, max_length = 250)
+    from_username = CharField(null = True, max_length = 250)
+
     rrules = CharField(max_length = 200)
     next_run = DateTimeField(null = True)
     message = CharField(null = True, max_length = 2500)
     sent = IntegerField(default = 0)
+
+    class Meta:
+        # Due reminders are looked up by sent and next_run
+        indexes = (
+            (('sent', 'next_run'), False),
+        )
@@ -22,8 +22,7 @@
 
 ''' An access control plugin '''
 
-import os
-import ConfigParser
+from hogar.Utils import Acl
 import logging
 
 logger = logging.getLogger(__name__)
@@ -110,35 +109,22 @@ def run (message):
         @return str
     '''
 
-    # Read the configuration as the plugin is run()
-    config = ConfigParser.ConfigParser()
-    config.read(
-        os.path.join(os.path.dirname(__file__), '../../../settings.ini'))
-
-    config_owners = config.get('acl', 'owners', '').split(',')
-    config_users = config.get('acl', 'users', '').split(',')
-
-    # If we dont have any users configured, set a empty
-    # list
-    if not any(config_users):
-        config_users = []
-
-    # If we don't have an owner configured, log it and respond.
-    if len(config_owners) < 1:
-        logger.error('ACL modification denied for {first_name}. No owners configured'.format(
-            first_name = message['from']['first_name']
-        ))
-        return 'I will only allow the owner to do this.'
-
     # If the request came from someone that is not a owner, log and respond
-    if str(message['from']['id']) not in config_owners:
+    if not Acl.is_owner(message['from']['id']):
         logger.error('ACL modification denied for {first_name}. Not an owner'.format(
             first_name = message['from']['first_name']
         ))
         return 'I will only allow the owner to do this.'
 
+    # Owners can not be toggled. They are imported from settings.ini
+    if Acl.is_owner(message['contact']['user_id']):
+        return '{first_name} ({id}) is an owner.'.format(
+            first_name = message['contact']['first_name'],
+            id = message['contact']['user_id']
+        )
+
     # check if the received contact is considered a user
-    if str(message['contact']['user_id']) in config_users:
+    if Acl.is_allowed(message['contact']['user_id']):
 
         # Remove the user
         logger.info('{owner_first_name} removed {first_name} ({id}) as a user'.format(
@@ -147,8 +133,7 @@ def run (message):
             id = message['contact']['user_id']
         ))
 
-        config_users.remove(str(message['contact']['user_id']))
-        config.set('acl', 'users', ','.join(config_users))
+        Acl.remove_user(message['contact']['user_id'])
 
         status = 'Removed {first_name} ({id}) as a user.'.format(
             first_name = message['contact']['first_name'],
@@ -164,17 +149,11 @@ def run (message):
             id = message['contact']['user_id']
         ))
 
-        config_users.append(str(message['contact']['user_id']))
-        config.set('acl', 'users', ','.join(config_users))
+        Acl.add_user(message['contact']['user_id'], message['contact']['first_name'])
 
         status = 'Added {first_name} ({id}) as a user.'.format(
             first_name = message['contact']['first_name'],
             id = message['contact']['user_id']
         )
 
-    # Write the confuration changes
-    with open(
-            os.path.join(os.path.dirname(__file__), '../../../settings.ini'), 'wb') as s:
-        config.write(s)
-
     return status
@@ -20,8 +20,6 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-from hogar.Utils.StringUtils import ignore_case_replace
-
 ''' A simple echo plugin '''
 
 def enabled ():
@@ -92,7 +90,19 @@ def reply_type ():
 
     return 'text'
 
-def run (message):
+def execution_class ():
+    '''
+        Execution Class
+
+        Specifies the lane this plugin runs in. It replies right away.
+
+        --
+        @return str
+    '''
+
+    return 'fast'
+
+def run (message, ctx):
     '''
         Run
 
@@ -102,25 +112,10 @@ def run (message):
 
         --
         @param  message:dict    The message sent by the user
+        @param  ctx:Context     The context the plugin is run with
 
         @return str
     '''
 
-    # Get the message contents
-    text = message['text']
-
-    # Remove a mention. This could be the case
-    # if the bot was mentioned in a chat room
-    if text.startswith('@'):
-        text = text.split(' ', 1)[1].strip()
-
-    # Some bots will accept commands that started
-    # with a '/'
-    if text.startswith('/'):
-        text = text.replace('/', '', 1).strip()
-
-    # Remove the trigger command
-    for command in commands():
-        text = ignore_case_replace(command, '', text).strip()
-
-    return text
+    # Echo whatever followed the trigger command
+    return ctx.args
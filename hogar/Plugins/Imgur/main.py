@@ -22,15 +22,16 @@
 
 ''' Search Imgur for a random image '''
 
-import ConfigParser
 import datetime
 import json
 import logging
 import random
+import threading
+import time
 
-import os
-import requests
-from hogar.Utils.StringUtils import ignore_case_replace
+from hogar.Utils.SharedCache import SharedCache
+from hogar.Utils.Cache import TTLCache
+from hogar.Utils import Settings
 from hogar.static import values as static_values
 
 logger = logging.getLogger(__name__)
@@ -39,6 +40,17 @@ api_base = 'https://api.imgur.com/3/'
 search_api = 'https://api.imgur.com/3/gallery/search/top/?q={term}'
 credits_api = 'https://api.imgur.com/3/credits'
 
+# Seconds to wait on the Imgur API
+request_timeout = 10
+
+# Search results are cached across workers, keyed by term. Terms
+# that are asked for often are refreshed in the background
+# before they expire, counting hits in this process.
+_cache = None
+_hits = TTLCache(max_size = 1024, ttl = None)
+_refreshing = set()
+_lock = threading.Lock()
+
 def enabled():
     '''
         Enabled
@@ -111,6 +123,18 @@ def reply_type():
 
     return 'text'
 
+def execution_class():
+    '''
+        Execution Class
+
+        Specifies the lane this plugin runs in. It waits on the Imgur API.
+
+        --
+        @return str
+    '''
+
+    return 'io'
+
 def _get_client_id():
     '''
         Get Client ID
@@ -121,11 +145,7 @@ def _get_client_id():
         @return str
 
     '''
-    config = ConfigParser.ConfigParser()
-    config.read(
-        os.path.join(os.path.dirname(__file__), '../../../settings.ini'))
-
-    return config.get('imgur', 'client_id', '')
+    return Settings.section('imgur').get('client_id', '')
 
 def _allow_nsfw():
     '''
@@ -138,11 +158,7 @@ def _allow_nsfw():
         @return bool
     '''
 
-    config = ConfigParser.ConfigParser()
-    config.read(
-        os.path.join(os.path.dirname(__file__), '../../../settings.ini'))
-
-    return config.getboolean('imgur', 'nsfw')
+    return Settings.section('imgur').getboolean('nsfw', False)
 
 def _client_id_set():
     '''
@@ -174,22 +190,23 @@ def _get_headers():
             client_id = _get_client_id())
     }
 
-def _ask_imgur(url):
+def _ask_imgur(url, http):
     '''
         Make an Api request to imgur, searching
         for a term.
 
         --
         @param url:str
+        @param http:object
 
         @return str
 
     '''
     try:
 
-        response = requests.get(url,
-                                headers = _get_headers(),
-                                verify = static_values.verify_ssl)
+        response = http.get(url,
+                            headers = _get_headers(),
+                            timeout = request_timeout)
 
         response = json.loads(response.text.strip())
 
@@ -199,7 +216,196 @@ def _ask_imgur(url):
 
     return response
 
-def _get_random_image(term):
+def _get_option(option, default):
+    '''
+        Get Option
+
+        Get an integer option from the [imgur] section.
+
+        --
+        @param option:str
+        @param default:int
+
+        @return int
+    '''
+
+    return Settings.section('imgur').getint(option, default)
+
+def _get_cache():
+    '''
+        Get Cache
+
+        Returns the search result cache, preparing it
+        if needed.
+
+        --
+        @return object
+    '''
+
+    global _cache
+
+    if _cache is None:
+        _cache = SharedCache(
+            'imgur',
+            max_size = _get_option('cache_size', 256),
+            ttl = _get_option('cache_ttl', 3600))
+
+    return _cache
+
+def _cache_key(term):
+    '''
+        Cache Key
+
+        Terms are cached regardless of their case or spacing.
+
+        --
+        @param term:str
+
+        @return str
+    '''
+
+    return u' '.join(term.lower().split()).encode('utf-8')
+
+def _index(results):
+    '''
+        Index
+
+        Prepare a cache entry from search results. Results
+        from the search may contain image data models or
+        gallery data models. Only images that are not albums
+        are kept as candidates, and the positions of those
+        that are not nsfw are indexed so that either may be
+        sampled from directly.
+
+        --
+        @param results:list
+
+        @return dict
+    '''
+
+    candidates = [{'title': image_data['title'],
+                   'link': image_data['link'],
+                   'nsfw': image_data['nsfw']}
+                  for image_data in results if not image_data['is_album']]
+
+    return {
+        'fetched': time.time(),
+        'candidates': candidates,
+        'safe': [i for i, image_data in enumerate(candidates) if not image_data['nsfw']]
+    }
+
+def _pick(entry, allow_nsfw):
+    '''
+        Pick
+
+        Pick a random candidate from a cache entry.
+
+        --
+        @param entry:dict
+        @param allow_nsfw:bool
+
+        @return dict    The candidate, or None if there is none to pick
+    '''
+
+    if allow_nsfw:
+        return random.choice(entry['candidates']) if entry['candidates'] else None
+
+    return entry['candidates'][random.choice(entry['safe'])] if entry['safe'] else None
+
+def _search(term, http):
+    '''
+        Search
+
+        Search Imgur for a term and cache the images found.
+
+        --
+        @param term:str
+        @param http:object
+
+        @return dict    The cache entry, or None if the search failed
+    '''
+
+    data = _ask_imgur(search_api.format(
+        term = term.encode('utf-8')), http)
+
+    if not isinstance(data, dict) or 'data' not in data:
+        return None
+
+    entry = _index(data['data'])
+
+    _get_cache().set(_cache_key(term), entry)
+
+    return entry
+
+def _refresh(term, http):
+    '''
+        Refresh
+
+        Search for a term again, to be run in the background.
+
+        --
+        @param term:str
+        @param http:object
+
+        @return None
+    '''
+
+    try:
+        _search(term, http)
+
+    except Exception, e:
+        logger.error('Refreshing Imgur results for {term} failed: {error}'.format(
+            term = term.encode('utf-8'), error = str(e)))
+
+    finally:
+        with _lock:
+            _refreshing.discard(_cache_key(term))
+
+    return
+
+def _get_candidates(term, http):
+    '''
+        Get Candidates
+
+        Get the cached images for a term, searching Imgur
+        when they are not cached. Cached results of terms
+        that were asked for at least hot_hits times since
+        they were fetched are refreshed in the background
+        once they are older than refresh_after seconds.
+
+        --
+        @param term:str
+        @param http:object
+
+        @return dict    The cache entry, or None if the search failed
+    '''
+
+    key = _cache_key(term)
+    entry = _get_cache().get(key)
+
+    if entry is None:
+        return _search(term, http)
+
+    with _lock:
+
+        hits = _hits.get(key, 0) + 1
+        _hits.set(key, hits)
+
+        if hits >= _get_option('hot_hits', 3) and key not in _refreshing and \
+                time.time() - entry['fetched'] > _get_option('refresh_after', 2700):
+
+            logger.debug('Refreshing Imgur results for {term}'.format(term = key))
+
+            _hits.delete(key)
+            _refreshing.add(key)
+
+            refresher = threading.Thread(target = _refresh, args = (term, http))
+            refresher.daemon = True
+            refresher.start()
+
+    return entry
+
+def _get_random_image(term, http):
     '''
         Get Random Image
 
@@ -207,34 +413,21 @@ def _get_random_image(term):
 
         --
         @param term:str
+        @param http:object
 
         @return str
     '''
-    data = _ask_imgur(search_api.format(
-        term = term.encode('utf-8')))
+    entry = _get_candidates(term, http)
 
-    if 'data' not in data or len(data['data']) <= 0:
+    if entry is None or len(entry['candidates']) <= 0:
         return 'Imgur query had no results'
 
-    # Results from the search may contain image data
-    # models or gallery data models. Filter the
-    # choices we make by ones that are not albums
-    is_album = True
-    while is_album:
-
-        # Try and filter out images that are marked as
-        # nsfw if the config is set for that.
-        if _allow_nsfw():
-            image_data = random.choice(data['data'])
-        else:
-            nsfw = True
-            while nsfw:
-                image_data = random.choice(data['data'])
-                if not image_data['nsfw']:
-                    nsfw = False
-
-        if not image_data['is_album']:
-            is_album = False
+    # Try and filter out images that are marked as
+    # nsfw if the config is set for that.
+    image_data = _pick(entry, _allow_nsfw())
+
+    if image_data is None:
+        return 'Imgur query had no results that are safe for work'
 
     response = ("\nTitle: {title}\n"
                 "Link: {link}")
@@ -242,16 +435,18 @@ def _get_random_image(term):
     return response.format(
         title = image_data['title'], link = image_data['link'])
 
-def _get_credits():
+def _get_credits(http):
     '''
         Get Credits
 
         Ask Imgur how many request credits are left
 
         --
+        @param http:object
+
         @return str
     '''
-    data = _ask_imgur(credits_api)
+    data = _ask_imgur(credits_api, http)
 
     response = ("\nRemaining Requests: {remaining}\n"
                 "Request Reset At: {reset_at}")
@@ -261,7 +456,7 @@ def _get_credits():
         reset_at = datetime.datetime.fromtimestamp(
             int(data['data']['UserReset'])).strftime('%Y-%m-%d %H:%M:%S'))
 
-def run(message):
+def run(message, ctx):
     '''
         Run
 
@@ -271,6 +466,7 @@ def run(message):
 
         --
         @param  message:dict    The message sent by the user
+        @param  ctx:Context     The context the plugin is run with
 
         @return str
     '''
@@ -279,26 +475,12 @@ def run(message):
         return ('Imgur Client-ID not set. Get one at '
                 'https://api.imgur.com/oauth2/addclient')
 
-    # Get the message contents
-    text = message['text']
-
-    # Remove a mention. This could be the case
-    # if the bot was mentioned in a chat room
-    if text.startswith('@'):
-        text = text.split(' ', 1)[1].strip()
-
-    # Some bots will accept commands that started
-    # with a '/'
-    if text.startswith('/'):
-        text = text.replace('/', '', 1).strip()
-
-    # Remove the trigger command
-    for command in commands():
-        text = ignore_case_replace(command, '', text).strip()
+    # The search term
+    text = ctx.args
 
     if text == 'credits':
-        response = _get_credits()
+        response = _get_credits(ctx.http)
     else:
-        response = _get_random_image(text)
+        response = _get_random_image(text, ctx.http)
 
     return response
@@ -92,6 +92,18 @@ def reply_type ():
 
     return 'text'
 
+def execution_class ():
+    '''
+        Execution Class
+
+        Specifies the lane this plugin runs in. It replies right away.
+
+        --
+        @return str
+    '''
+
+    return 'fast'
+
 def run (message):
     '''
         Run
@@ -23,7 +23,6 @@
 ''' Send a random Joke '''
 
 import pyjokes
-from hogar.Utils.StringUtils import ignore_case_replace
 
 def enabled ():
     '''
@@ -118,7 +117,19 @@ def _show_help ():
 
     return h
 
-def run (message):
+def execution_class ():
+    '''
+        Execution Class
+
+        Specifies the lane this plugin runs in. It replies right away.
+
+        --
+        @return str
+    '''
+
+    return 'fast'
+
+def run (message, ctx):
     '''
         Run
 
@@ -128,36 +139,21 @@ def run (message):
 
         --
         @param  message:dict    The message sent by the user
+        @param  ctx:Context     The context the plugin is run with
 
         @return str
     '''
 
-    # Get the message contents
-    text = message['text']
-
-    # Remove a mention. This could be the case
-    # if the bot was mentioned in a chat room
-    if text.startswith('@'):
-        text = text.split(' ', 1)[1].strip()
-
-    # Some bots will accept commands that started
-    # with a '/'
-    if text.startswith('/'):
-        text = text.replace('/', '', 1).strip()
-
-    # Try and determine what was the trigger command
-    # for this plugin.
-    action = text.split(' ')[0].strip()
+    # The trigger command for this plugin and
+    # what followed it
+    action = ctx.command
+    text = ctx.args
 
     # Hopefully we never get here, but just in case.
     if action not in commands():
         return 'Sorry, I don\'t know what to do with: {command}'.format(
             command = action)
 
-    # Remove the trigger command
-    for command in commands():
-        text = ignore_case_replace(command, '', text).strip()
-
     if text == 'help':
         return _show_help()
 
@@ -24,7 +24,6 @@
 
 from hogar.Models.LearnKey import LearnKey
 from hogar.Models.LearnValue import LearnValue
-from hogar.Utils.StringUtils import ignore_case_replace
 import peewee
 import logging
 
@@ -213,7 +212,7 @@ def _show (text):
 
     return 'I have no idea what you are talking about.'
 
-def run (message):
+def run (message, ctx):
     '''
         Run
 
@@ -223,26 +222,15 @@ def run (message):
 
         --
         @param  message:dict    The message sent by the user
+        @param  ctx:Context     The context the plugin is run with
 
         @return str
     '''
 
-    # Get the message contents
-    text = message['text']
-
-    # Remove a mention. This could be the case
-    # if the bot was mentioned in a chat room
-    if text.startswith('@'):
-        text = text.split(' ', 1)[1].strip()
-
-    # Some bots will accept commands that started
-    # with a '/'
-    if text.startswith('/'):
-        text = text.replace('/', '', 1).strip()
-
-    # Try and determine what was the trigger command
-    # for this plugin.
-    action = text.split(' ')[0].strip()
+    # The trigger command for this plugin and
+    # what followed it
+    action = ctx.command
+    text = ctx.args
 
     # Hopefully we never get here, but just in case.
     if action not in commands():
@@ -250,10 +238,6 @@ def run (message):
             command = action
         )
 
-    # Remove the trigger command
-    for command in commands():
-        text = ignore_case_replace(command, '', text).strip()
-
     # Map actions to function and () them
     do_action = {
         'learn': _learn,
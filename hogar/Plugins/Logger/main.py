@@ -24,11 +24,23 @@
 
 from hogar.static import values as static_values
 from hogar.Models.Logger import Logger
+from hogar.Utils import BufferedWriter
+from hogar.Utils import Settings
 
+import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+config = Settings.section('logger')
+
+# Messages are written in batches rather than one by one. The
+# writer outlives plugin reloads, so its buffer and timer do too.
+writer = BufferedWriter.get_writer(
+    Logger,
+    batch_size = config.getint('batch_size', 100),
+    flush_interval = config.getint('flush_interval', 5))
+
 def enabled ():
     '''
         Enabled
@@ -102,13 +114,13 @@ def _process_from (message, record):
         Process From
 
         Take a Telegram Message payload as well as a Hogar
-        Logger Model and populate the from_* information
+        Logger row and populate the from_* information
 
         --
         @param  message:dict    The message sent by the user
-        @param  record:object   The hogar.Models.Logger.Logger object
+        @param  record:dict     The hogar.Models.Logger.Logger row
 
-        @return str
+        @return dict
     '''
 
     # from_username = CharField(null = True, max_length = 250)
@@ -124,16 +136,16 @@ def _process_from (message, record):
     # },
 
     if 'username' in message['from']:
-        record.from_username = message['from']['username']
+        record['from_username'] = message['from']['username']
 
     if 'first_name' in message['from']:
-        record.from_first_name = message['from']['first_name']
+        record['from_first_name'] = message['from']['first_name']
 
     if 'last_name' in message['from']:
-        record.from_last_name = message['from']['last_name']
+        record['from_last_name'] = message['from']['last_name']
 
     if 'id' in message['from']:
-        record.from_id = message['from']['id']
+        record['from_id'] = message['from']['id']
 
     return record
 
@@ -142,13 +154,13 @@ def _process_chat (message, record):
         Process Chat
 
         Take a Telegram Message payload as well as a Hogar
-        Logger Model and populate the chat_* information
+        Logger row and populate the chat_* information
 
         --
         @param  message:dict    The message sent by the user
-        @param  record:object   The hogar.Models.Logger.Logger object
+        @param  record:dict     The hogar.Models.Logger.Logger row
 
-        @return str
+        @return dict
     '''
 
 
@@ -171,19 +183,19 @@ def _process_chat (message, record):
     # }
 
     if 'title' in message['chat']:
-        record.chat_title = message['chat']['title']
+        record['chat_title'] = message['chat']['title']
 
     if 'id' in message['chat']:
-        record.chat_id = message['chat']['id']
+        record['chat_id'] = message['chat']['id']
 
     if 'username' in message['chat']:
-        record.chat_username = message['chat']['username']
+        record['chat_username'] = message['chat']['username']
 
     if 'first_name' in message['chat']:
-        record.chat_first_name = message['chat']['first_name']
+        record['chat_first_name'] = message['chat']['first_name']
 
     if 'last_name' in message['chat']:
-        record.chat_last_name = message['chat']['last_name']
+        record['chat_last_name'] = message['chat']['last_name']
 
     return record
 
@@ -192,13 +204,13 @@ def _process_file_id (message, record):
         Process File ID
 
         Take a Telegram Message payload as well as a Hogar
-        Logger Model and populate the file_id information
+        Logger row and populate the file_id information
 
         --
         @param  message:dict    The message sent by the user
-        @param  record:object   The hogar.Models.Logger.Logger object
+        @param  record:dict     The hogar.Models.Logger.Logger row
 
-        @return str
+        @return dict
     '''
 
 
@@ -212,7 +224,7 @@ def _process_file_id (message, record):
     #   }
     # ],
     if 'photo' in message:
-        record.file_id = message['photo'][0]['file_id']
+        record['file_id'] = message['photo'][0]['file_id']
 
     # u'sticker':{
     #   u'width':482,
@@ -227,7 +239,7 @@ def _process_file_id (message, record):
     #   u'file_size':43636
     # },
     elif 'sticker' in message:
-        record.file_id = message['sticker']['file_id']
+        record['file_id'] = message['sticker']['file_id']
 
     # u'audio':{
     #   u'duration':1,
@@ -236,7 +248,7 @@ def _process_file_id (message, record):
     #   u'file_size':9162
     # },
     elif 'audio' in message:
-        record.file_id = message['audio']['file_id']
+        record['file_id'] = message['audio']['file_id']
 
     # u'document':{
     #   u'file_name':u'test.js',
@@ -246,7 +258,7 @@ def _process_file_id (message, record):
     #   u'file_size':34728
     # },
     elif 'document' in message:
-        record.file_id = message['document']['file_id']
+        record['file_id'] = message['document']['file_id']
 
     # return
     return record
@@ -273,32 +285,21 @@ def run (message):
     # Should never have more than one anyways.
     tg_type = tg_type[0]
 
-    # Check if we already know about this message.
-    # Honestly can't think of a case were this
-    # will actually happen. Nonetheless, lets
-    # check and warn.
-    try:
-        Logger.get(Logger.message_id == message['message_id'])
-        logger.warning('Message {id} already exists in the database.'.format(
-            id = message['message_id']
-        ))
-        return
-
-    except Logger.DoesNotExist:
+    logger.debug('Storing message id {id} which is a {tg_type} message'.format(
+        id = message['message_id'],
+        tg_type = tg_type
+    ))
 
-        # Nope. Create it!
-        logger.debug('Storing message id {id} which is a {tg_type} message'.format(
-            id = message['message_id'],
-            tg_type = tg_type
-        ))
-
-        # Start a new Logger instance
-        l = Logger(message_id = message['message_id'])
+    # Start a new Logger row. Every row in a batch needs
+    # the same fields, so all of them are set here.
+    l = {field: None for field in Logger._meta.fields.keys() if field != 'id'}
+    l['created_date'] = datetime.datetime.now()
+    l['message_id'] = message['message_id']
 
     # Set some fields that are always applicable
     # to any message type
-    l.message_type = tg_type
-    l.telegram_date = message['date']
+    l['message_type'] = tg_type
+    l['telegram_date'] = message['date']
 
     # Populate the 'from' details
     l = _process_from(message, l)
@@ -312,9 +313,25 @@ def run (message):
     l = _process_file_id(message, l)
 
     # If there is text, add that too
-    l.text = message['text'] if 'text' in message else None
+    l['text'] = message['text'] if 'text' in message else None
+
+    # Aaand buffer. Messages we already know about
+    # are ignored when the buffer is written.
+    writer.add(l)
+
+    return
+
+def shutdown ():
+    '''
+        Shutdown
+
+        Called when the plugin is unloaded or the process
+        running it exits. Writes any buffered messages.
+
+        --
+        @return None
+    '''
 
-    # Aaand save.
-    l.save()
+    writer.flush()
 
     return
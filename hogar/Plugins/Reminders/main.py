@@ -21,23 +21,31 @@
 # THE SOFTWARE.
 
 ''' A Simple Reminder Plugin '''
-from hogar.Utils.StringUtils import ignore_case_replace
 from recurrent import RecurringEvent
-from dateutil.rrule import rrulestr
 from hogar.Models.RemindOnce import RemindOnce
 from hogar.Models.RemindRecurring import RemindRecurring
-import os
+from hogar.Utils import Scheduler
+from hogar.Utils import RRule
+from hogar.Utils.Cache import TTLCache
+from hogar.Utils import Settings
 import arrow
 import datetime
 import json
-import ConfigParser
 import logging
 
 logger = logging.getLogger(__name__)
 
-config = ConfigParser.ConfigParser()
-config.read(
-    os.path.join(os.path.dirname(__file__), '../../../settings.ini'))
+# Parsed times, keyed by the normalized phrase. Phrases
+# that resolve to the same time regardless of when they
+# are parsed are kept as is, while phrases relative to
+# now are kept as an offset from it.
+parse_cache = TTLCache(
+    max_size = Settings.section('reminder').getint('parse_cache_size', 1024),
+    ttl = None)
+
+# Offsets of a month or more depend on the length of
+# the months involved, so those are never cached.
+max_relative_offset = datetime.timedelta(days = 28)
 
 def enabled ():
     '''
@@ -111,6 +119,60 @@ def reply_type ():
 
     return 'text'
 
+def _parse_time (time):
+    '''
+        Parse Time
+
+        Resolve a human time to a datetime or a RRULE,
+        using the parse cache where possible.
+
+        A new phrase is parsed relative to two different
+        times. If both results are the same, the phrase
+        is absolute. If both are the same distance from
+        the time they were parsed at, it is relative.
+        Anything else is not cached.
+
+        --
+        @param  time:str    The human time
+
+        @return datetime|str|None
+    '''
+
+    key = ' '.join(time.lower().split())
+    now = datetime.datetime.now().replace(microsecond = 0)
+
+    cached = parse_cache.get(key)
+
+    if cached is not None:
+        kind, value = cached
+
+        if kind == 'relative':
+            return now + value
+
+        # Absolute times that have passed may well
+        # mean the next occurrence of them now
+        if not isinstance(value, datetime.datetime) or value > now:
+            return value
+
+    parsed_time = RecurringEvent(now_date = now).parse(time)
+
+    if parsed_time is None:
+        return None
+
+    later = now + datetime.timedelta(days = 1, hours = 1, minutes = 1, seconds = 1)
+    parsed_later = RecurringEvent(now_date = later).parse(time)
+
+    if parsed_later == parsed_time:
+        parse_cache.set(key, ('absolute', parsed_time))
+
+    elif isinstance(parsed_time, datetime.datetime) and \
+            isinstance(parsed_later, datetime.datetime) and \
+            parsed_time - now == parsed_later - later and \
+            abs(parsed_time - now) < max_relative_offset:
+        parse_cache.set(key, ('relative', parsed_time - now))
+
+    return parsed_time
+
 def _extract_parts (text):
     '''
         Extract Parts
@@ -204,8 +266,7 @@ def _extract_parts (text):
 
     # Resolve the human time to something we can work
     # with
-    r = RecurringEvent()
-    parsed_time = r.parse(time)
+    parsed_time = _parse_time(time)
 
     # If the time parsing failed, oh well.
     if parsed_time is None:
@@ -224,6 +285,26 @@ def _extract_parts (text):
 
     return parts
 
+def _sender_fields (orig_message):
+    '''
+        Sender Fields
+
+        Get the chat and sender columns that are stored
+        alongside a reminder.
+
+        --
+        @param  orig_message:dict   The original message received
+
+        @return dict
+    '''
+
+    return {
+        'chat_id': orig_message['chat']['id'],
+        'from_first_name': orig_message['from'].get('first_name'),
+        'from_last_name': orig_message['from'].get('last_name'),
+        'from_username': orig_message['from'].get('username')
+    }
+
 def _set_once_reminder (r, orig_message):
     '''
         Set Once Reminder
@@ -241,12 +322,15 @@ def _set_once_reminder (r, orig_message):
         id = orig_message['chat']['id']
     ))
 
-    RemindOnce.create(
+    reminder = RemindOnce.create(
         orig_message = json.dumps(orig_message),
         time = r['parsed_time'],
-        message = r['message']
+        message = r['message'],
+        **_sender_fields(orig_message)
     )
 
+    Scheduler.notify('once', reminder.id, reminder.time)
+
     return
 
 def _set_recurring_reminder (r, orig_message):
@@ -268,14 +352,16 @@ def _set_recurring_reminder (r, orig_message):
         id = orig_message['chat']['id']
     ))
 
-    RemindRecurring.create(
+    reminder = RemindRecurring.create(
         orig_message = json.dumps(orig_message),
         rrules = r['parsed_time'],
-        next_run = rrulestr(r['parsed_time'],
-                            dtstart = datetime.datetime.now()).after(datetime.datetime.now()),
-        message = r['message']
+        next_run = RRule.next_run(r['parsed_time'], datetime.datetime.now()),
+        message = r['message'],
+        **_sender_fields(orig_message)
     )
 
+    Scheduler.notify('recurring', reminder.id, reminder.next_run)
+
     return
 
 def _show_all_reminders (message):
@@ -291,35 +377,34 @@ def _show_all_reminders (message):
         @return str
     '''
 
+    timezone = Settings.section('reminder').get('timezone', 'UTC')
     response = '\n# One time reminders:\n\n'
 
-    for reminder in RemindOnce.select().where(RemindOnce.sent == 0,
+    for reminder in RemindOnce.select().where(RemindOnce.chat_id == message['chat']['id'],
+                                              RemindOnce.sent == 0,
                                               RemindOnce.time >= datetime.datetime.now()):
 
-        orig_message = json.loads(reminder.orig_message)
-        if orig_message['chat']['id'] == message['chat']['id']:
-            response += '(#{id}) {human} @{time} | {message}\n'.format(
-                id = reminder.id,
-                human = arrow.get(reminder.time,
-                                  config.get('reminder', 'timezone', 'UTC')).humanize(),
-                time = str(reminder.time),
-                message = reminder.message[:20] + '...' \
-                    if len(reminder.message) > 20 else reminder.message)
+        response += '(#{id}) {human} @{time} | {message}\n'.format(
+            id = reminder.id,
+            human = arrow.get(reminder.time,
+                              timezone).humanize(),
+            time = str(reminder.time),
+            message = reminder.message[:20] + '...' \
+                if len(reminder.message) > 20 else reminder.message)
 
     response += '\n# Recurring reminders:\n\n'
 
-    for reminder in RemindRecurring.select().where(RemindRecurring.sent == 0,
+    for reminder in RemindRecurring.select().where(RemindRecurring.chat_id == message['chat']['id'],
+                                                   RemindRecurring.sent == 0,
                                                    RemindRecurring.next_run >= datetime.datetime.now()):
 
-        orig_message = json.loads(reminder.orig_message)
-        if orig_message['chat']['id'] == message['chat']['id']:
-            response += '(#{id}) {human} @{next_run} | {message}\n'.format(
-                id = reminder.id,
-                human = arrow.get(reminder.next_run,
-                                  config.get('reminder', 'timezone', 'UTC')).humanize(),
-                next_run = str(reminder.next_run),
-                message = reminder.message[:20] + '...' \
-                    if len(reminder.message) > 20 else reminder.message)
+        response += '(#{id}) {human} @{next_run} | {message}\n'.format(
+            id = reminder.id,
+            human = arrow.get(reminder.next_run,
+                              timezone).humanize(),
+            next_run = str(reminder.next_run),
+            message = reminder.message[:20] + '...' \
+                if len(reminder.message) > 20 else reminder.message)
 
     return response
 
@@ -364,45 +449,31 @@ def _stop_reminder (message):
     # and mark the message as sent if its ok
     if message_type == 'once':
 
-        try:
-            m = RemindOnce.select().where(RemindOnce.id == message_number).get()
-
-            if json.loads(m.orig_message)['chat']['id'] == message['chat']['id']:
-
-                m.sent = 1
-                m.save()
-
-            else:
+        stopped = RemindOnce.update(sent = 1).where(RemindOnce.id == message_number,
+                                                    RemindOnce.chat_id == message['chat']['id']).execute()
 
-                logger.warning('User {id} tried to disable a reminder they dont own'.format(
-                    id = message['chat']['id']))
-                return 'That message number does not exist or you dont own it.'
-
-        except RemindOnce.DoesNotExist:
+        if not stopped:
+            logger.warning('User {id} tried to disable a reminder they dont own'.format(
+                id = message['chat']['id']))
             return 'That message number does not exist or you dont own it.'
 
+        Scheduler.notify('once', int(message_number), None)
+
         return 'Done stopping the one time reminder'
 
     # The same here for the recurring message.
     if message_type == 'recurring':
 
-        try:
-            m = RemindRecurring.select().where(RemindRecurring.id == message_number).get()
-
-            if json.loads(m.orig_message)['chat']['id'] == message['chat']['id']:
-
-                m.sent = 1
-                m.save()
-
-            else:
-
-                logger.warning('User {id} tried to disable a reminder they dont own'.format(
-                    id = message['chat']['id']))
-                return 'That message number does not exist or you dont own it.'
+        stopped = RemindRecurring.update(sent = 1).where(RemindRecurring.id == message_number,
+                                                         RemindRecurring.chat_id == message['chat']['id']).execute()
 
-        except RemindRecurring.DoesNotExist:
+        if not stopped:
+            logger.warning('User {id} tried to disable a reminder they dont own'.format(
+                id = message['chat']['id']))
             return 'That message number does not exist or you dont own it.'
 
+        Scheduler.notify('recurring', int(message_number), None)
+
         return 'Done stopping the recurring reminder'
 
     # We will most probably never get here, but
@@ -431,7 +502,7 @@ def _show_help (message):
 
     return h
 
-def run (message):
+def run (message, ctx):
     '''
         Run
 
@@ -441,26 +512,15 @@ def run (message):
 
         --
         @param  message:dict    The message sent by the user
+        @param  ctx:Context     The context the plugin is run with
 
         @return str
     '''
 
-    # Get the message contents
-    text = message['text']
-
-    # Remove a mention. This could be the case
-    # if the bot was mentioned in a chat room
-    if text.startswith('@'):
-        text = text.split(' ', 1)[1].strip()
-
-    # Some bots will accept commands that started
-    # with a '/'
-    if text.startswith('/'):
-        text = text.replace('/', '', 1).strip()
-
-    # Try and determine what was the trigger command
-    # for this plugin.
-    action = text.split(' ')[0].strip()
+    # The trigger command for this plugin and
+    # what followed it
+    action = ctx.command
+    text = ctx.args
 
     # Hopefully we never get here, but just in case.
     if action not in commands():
@@ -468,10 +528,6 @@ def run (message):
             command = action
         )
 
-    # Remove the trigger command
-    for command in commands():
-        text = ignore_case_replace(command, '', text).strip()
-
     # Now, parse the reminder line
     parts = _extract_parts(text)
 
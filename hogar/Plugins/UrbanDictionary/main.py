@@ -22,7 +22,8 @@
 
 ''' A simple Urban Dictionary Lookup Plugin '''
 
-from hogar.Utils.StringUtils import ignore_case_replace
+from hogar.Utils.SharedCache import SharedCache
+from hogar.Utils import Settings
 import requests
 import json
 import logging
@@ -30,6 +31,13 @@ import logging
 logger = logging.getLogger(__name__)
 api = 'http://api.urbandictionary.com/v0/define?term={term}'
 
+# Seconds to wait on the Urban Dictionary API
+request_timeout = 10
+
+# Definitions are cached across workers, keyed by term
+_missing = object()
+_cache = None
+
 def enabled ():
     '''
         Enabled
@@ -102,38 +110,79 @@ def reply_type ():
 
     return 'text'
 
-def run (message):
+def execution_class ():
     '''
-        Run
+        Execution Class
 
-        Run the custom plugin specific code. A returned
-        string is the message that will be sent back
-        to the user.
+        Specifies the lane this plugin runs in. It waits on the Urban Dictionary API.
 
         --
-        @param  message:dict    The message sent by the user
-
         @return str
     '''
 
-    # Get the text
-    text = message['text']
+    return 'io'
+
+def _get_cache ():
+    '''
+        Get Cache
+
+        Returns the lookup cache, preparing it with the
+        [urbandictionary] settings if needed.
+
+        --
+        @return object
+    '''
+
+    global _cache
+
+    if _cache is None:
+        config = Settings.section('urbandictionary')
+
+        _cache = SharedCache(
+            'urbandictionary',
+            max_size = config.getint('cache_size', 1024),
+            ttl = config.getint('cache_ttl', 86400))
+
+    return _cache
+
+def _get_negative_ttl ():
+    '''
+        Get Negative TTL
+
+        Returns how long terms without results are cached for.
+
+        --
+        @return int
+    '''
+
+    return Settings.section('urbandictionary').getint('negative_ttl', 3600)
 
-    # Remove the trigger command
-    for command in commands():
-        text = ignore_case_replace(command, '', text).strip()
+def _lookup (term, http):
+    '''
+        Lookup
+
+        Ask Urban Dictionary for the definition of a term.
+
+        --
+        @param  term:str    The term to look up
+        @param  http:object The session to make the request with
+
+        @return dict|None|str   The definition, None when there are no
+                                results or a message if the lookup failed.
+    '''
 
     # Call Urban Dictionary API for a definition
     # if the user supplied term
     try:
 
         logger.debug('Asking Urban Dictionary what is {term}'.format(
-            term = text))
+            term = term))
 
         # The actual lookup request
-        response = requests.get(
+        response = http.get(
             api.format(
-                term = text.encode('utf-8')))
+                term = term.encode('utf-8')),
+            timeout = request_timeout)
 
     except Exception, e:
 
@@ -145,7 +194,7 @@ def run (message):
     # Ensure the response was OK from an HTTP perspective
     if not response.status_code == requests.codes.ok:
         return 'Failed to ask Urban Dictionary what {term} means'.format(
-            term = text)
+            term = term)
 
     # Try and parse the response json
     try:
@@ -164,7 +213,7 @@ def run (message):
 
         # check that we actually got something
         if response_data['result_type'] == 'no_results':
-            return 'The lookup returned no results.'
+            return None
 
     except Exception, e:
 
@@ -176,11 +225,13 @@ def run (message):
     # Get the actual definitions
     try:
 
-        definition = response_data['list'][0]['definition']
-        example = response_data['list'][0]['example']
-        author = response_data['list'][0]['author']
-        permalink = response_data['list'][0]['permalink']
-        tags = ', '.join(response_data['tags'])
+        return {
+            'definition': response_data['list'][0]['definition'],
+            'example': response_data['list'][0]['example'],
+            'author': response_data['list'][0]['author'],
+            'permalink': response_data['list'][0]['permalink'],
+            'tags': ', '.join(response_data['tags'])
+        }
 
     except Exception, e:
 
@@ -189,14 +240,49 @@ def run (message):
 
         return 'Unable to parse response. See logs for more details.'
 
+def run (message, ctx):
+    '''
+        Run
+
+        Run the custom plugin specific code. A returned
+        string is the message that will be sent back
+        to the user.
+
+        --
+        @param  message:dict    The message sent by the user
+        @param  ctx:Context     The context the plugin is run with
+
+        @return str
+    '''
+
+    # The term to look up
+    text = ctx.args
+
+    # Terms are cached regardless of their case or spacing,
+    # and terms without results are cached too
+    key = u' '.join(text.lower().split()).encode('utf-8')
+    entry = _get_cache().get(key, _missing)
+
+    if entry is _missing:
+        entry = _lookup(text, ctx.http)
+
+        # Failed lookups are not cached
+        if isinstance(entry, basestring):
+            return entry
+
+        _get_cache().set(key, entry, ttl = _get_negative_ttl() if entry is None else None)
+
+    if entry is None:
+        return 'The lookup returned no results.'
+
     # Construct the final response message
     final_definition = u'\'{term}\' is defined by \'{author}\' as:\n\n* Definition: {definition}\n* Example: {' \
                        u'example}\n\nTags: {tags}\n\nSee: {permalink}'.format(
         term = text,
-        author = author,
-        definition = definition,
-        example = example,
-        tags = tags,
-        permalink = permalink)
+        author = entry['author'],
+        definition = entry['definition'],
+        example = entry['example'],
+        tags = entry['tags'],
+        permalink = entry['permalink'])
 
     return final_definition
@@ -94,7 +94,37 @@ def reply_type ():
 
     return 'text'
 
-def run (message):
+def execution_class ():
+    '''
+        Execution Class
+
+        Specifies the lane this plugin runs in. Use 'fast' for
+        plugins that return right away, 'io' for plugins that
+        wait on the network or database and 'cpu' for plugins
+        that do heavy work. This is an optional function and
+        defaults to 'io'.
+
+        --
+        @return str
+    '''
+
+    return 'io'
+
+def timeout ():
+    '''
+        Timeout
+
+        Specifies how many seconds run() may take before it is
+        interrupted. This is an optional function and defaults
+        to plugin_timeout in the [advanced] section.
+
+        --
+        @return float
+    '''
+
+    return 30
+
+def run (message, ctx):
     '''
         Run
 
@@ -102,10 +132,37 @@ def run (message):
         string is the message that will be sent back
         to the user.
 
+        The context has the command that triggered the
+        plugin as ctx.command and the text that followed
+        it as ctx.args, as well as the bot mentioned in
+        front of the command as ctx.mention and the bot
+        name after it as ctx.bot. It also offers a pooled HTTP
+        session as ctx.http, the database as ctx.db, the
+        settings section named after the plugin as
+        ctx.settings and a logger as ctx.logger. The ctx
+        argument is optional, plugins may take only the
+        message.
+
         --
         @param  message:dict    The message sent by the user
+        @param  ctx:Context     The context the plugin is run with
 
         @return str
     '''
 
     return 'This is a sample'
+
+def shutdown ():
+    '''
+        Shutdown
+
+        Called when the plugin is unloaded, or when the
+        process running it exits. Use it to write out
+        anything the plugin still holds on to. This is
+        an optional function.
+
+        --
+        @return None
+    '''
+
+    return
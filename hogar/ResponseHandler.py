@@ -23,14 +23,96 @@
 from hogar.static import values as static_values
 from hogar.Utils import PluginLoader
 from hogar.Utils import Telegram
-import ConfigParser
+from hogar.Utils import Settings
+from hogar.Utils import Acl
+from hogar.Utils import Deadline
+from hogar.Utils.Context import Context
+from hogar.Utils import Tokenizer
 import traceback
 
-import os
 import logging
 
 logger = logging.getLogger(__name__)
-config = ConfigParser.ConfigParser()
+
+def get_message_type (message):
+    '''
+        Get the message type.
+
+        --
+        @param  message:dict    The message received.
+
+        @return str
+    '''
+
+    # Search for the message type
+    type_search = [message_type for message_type in static_values.possible_message_types \
+                   if message_type in message]
+
+    # check that we only got 1 result back from the search
+    if len(type_search) > 1:
+        logger.warning('More than 1 message type found: ({res}). Selecting only the first entry'.format(
+            res = ', '.join(type_search)
+        ))
+
+    return type_search[0]
+
+def find_applicable_plugins (message, message_type, command_map, tokens = None):
+    '''
+        Find Applicable plugins based on message type.
+
+        --
+        @param  message:dict        The message received.
+        @param  message_type:str    The type of the message.
+        @param  command_map:dict    The command/type/plugin map.
+        @param  tokens:Tokens       The tokenized text of a text message,
+                                    if it was tokenized already.
+
+        @return dict
+    '''
+
+    # Text types are special for the fact that they can have
+    # command triggers too. We will only return a map
+    # of those that have the command.
+    if message_type == 'text':
+
+        if tokens is None:
+            tokens = Tokenizer.tokenize(message['text'])
+
+        # Return all of the plugins that have the command
+        # defined as applicable, or any plugins that use
+        # the wildcard command
+        return PluginLoader.command_index.get(tokens.command, PluginLoader.wildcard_plugins)
+
+    return command_map[message_type]
+
+def route (update, command_map):
+    '''
+        Route
+
+        Group the names of the plugins that apply to an
+        update by the lane they should run in.
+
+        --
+        @param  update:dict         The parsed Telegram update object.
+        @param  command_map:dict    The command/type/plugin map.
+
+        @return dict
+    '''
+
+    message = update.get('message')
+
+    # Updates we have no plugins for are not routed
+    if not message or not any(message_type in message \
+                              for message_type in static_values.possible_message_types):
+        return {}
+
+    lanes = {}
+
+    for plugin in find_applicable_plugins(message, get_message_type(message), command_map):
+        lanes.setdefault(plugin.get('execution_class', static_values.default_execution_class),
+                         []).append(plugin['name'])
+
+    return lanes
 
 class Response(object):
     '''
@@ -43,11 +125,13 @@ class Response(object):
 
     response = None
     command_map = None
+    loaded_plugins = None
     message_type = None
+    tokens = None
     plugins = None
     sender_information = {'id': None, 'first_name': None, 'last_name': None, 'username': None}
 
-    def __init__ (self, response, command_map):
+    def __init__ (self, response, command_map, plugins = None):
 
         '''
             Prepare a new Response() instance.
@@ -59,6 +143,8 @@ class Response(object):
             --
             @param  response:dict       The parsed Telegram response.
             @param  command_map:dict    The command/type/plugin map.
+            @param  plugins:list        Only run the applicable plugins with
+                                        these names. None runs them all.
 
             @return None
         '''
@@ -76,15 +162,27 @@ class Response(object):
         self.response = response['message']
         self.command_map = command_map
 
+        # Hold on to the plugins loaded right now. Should they
+        # be reloaded while we run, we finish with these.
+        self.loaded_plugins = PluginLoader.loaded_plugins
+
         self.message_type = self._get_message_type()
         logger.info('Message {message_id} is a {type} message'.format(
             message_id = response['message']['message_id'],
             type = self.message_type
         ))
 
+        # The text is tokenized once here for
+        # all of the plugins to use
+        if self.message_type == 'text':
+            self.tokens = Tokenizer.tokenize(self.response['text'])
+
         self.sender_information = self._get_sender_information()
         self.plugins = self._find_applicable_plugins()
 
+        if plugins is not None:
+            self.plugins = [plugin for plugin in self.plugins if plugin['name'] in plugins]
+
         return
 
     def _get_message_type (self):
@@ -96,17 +194,7 @@ class Response(object):
             @return str
         '''
 
-        # Search for the message type
-        type_search = [message_type for message_type in static_values.possible_message_types \
-                       if message_type in self.response]
-
-        # check that we only got 1 result back from the search
-        if len(type_search) > 1:
-            logger.warning('More than 1 message type found: ({res}). Selecting only the first entry'.format(
-                res = ', '.join(type_search)
-            ))
-
-        return type_search[0]
+        return get_message_type(self.response)
 
     def _get_sender_information (self):
 
@@ -138,40 +226,23 @@ class Response(object):
             @return dict
         '''
 
-        # Text types are special for the fact that they can have
-        # command triggers too. We will only return a map
-        # of those that have the command.
-        #
-        # We will have to clean up the text and remove any '/' or
-        # '@' mentions so that the command may be triggered
-        if self.message_type == 'text':
+        return find_applicable_plugins(self.response, self.message_type,
+                                       self.command_map, self.tokens)
 
-            text = self.response['text']
+    def get_context (self, name):
 
-            # Remove a mention. This could be the case
-            # if the bot was mentioned in a chat room
-            if text.startswith('@'):
-                text = text.split(' ', 1)[1].strip()
+        '''
+            Get Context
 
-            # Some bots will accept commands that started
-            # with a '/'
-            if text.startswith('/'):
-                # Remove the leading /
-                text = text.replace('/', '', 1).strip()
+            Prepare the context a plugin is run with.
 
-                # If more than one bot is in a group chat, the
-                # Telegram client with have commands autocomleted
-                # as /action@bot_name. We will remove the mention
-                # in order to extract the command
-                text = text.split('@')[0].strip()
+            --
+            @param  name:str    The name of the plugin.
 
-            # Return all of the plugins that have the command
-            # defined as applicable, or any plugins that use
-            # the wildcard command
-            return [x for x in self.command_map['text'] \
-                    if text.split(' ')[0].lower() in x['commands'] or '*' in x['commands']]
+            @return Context
+        '''
 
-        return self.command_map[self.message_type]
+        return Context(self.response, self.message_type, name, self.tokens or Tokenizer.empty)
 
     def check_acl (self):
 
@@ -187,20 +258,13 @@ class Response(object):
             @return bool
         '''
 
-        # Read the configuration file. We do this here as the
-        # acls may have changed since the last time this
-        # module was loaded
-        config.read(
-            os.path.join(os.path.dirname(__file__), '../settings.ini'))
-
-        message_from_id = str(self.response['from']['id'])
+        message_from_id = self.response['from']['id']
 
         # Check if ACL processing is enabled
-        if not config.getboolean('acl', 'enabled'):
+        if not Settings.get()['acl_enabled']:
             return True
 
-        if message_from_id not in config.get('acl', 'owners').split(',') \
-                and message_from_id not in config.get('acl', 'users').split(','):
+        if not Acl.is_allowed(message_from_id):
             logger.error('{first_name} ({id}) is not allowed to use this bot'.format(
                 first_name = self.response['from']['first_name'],
                 id = message_from_id
@@ -209,6 +273,33 @@ class Response(object):
 
         return True
 
+    def get_timeout (self, name, loaded_plugin):
+
+        '''
+            Get Timeout
+
+            Determine how long a plugin may run for. A value for
+            the plugin in the [timeouts] section wins, followed
+            by the plugins own optional timeout() and lastly
+            plugin_timeout in the [advanced] section.
+
+            --
+            @param  name:str                The name of the plugin.
+            @param  loaded_plugin:module    The loaded plugin.
+
+            @return float
+        '''
+
+        timeouts = Settings.section('timeouts')
+
+        if timeouts.has(name):
+            return timeouts.getfloat(name)
+
+        if hasattr(loaded_plugin, 'timeout'):
+            return loaded_plugin.timeout()
+
+        return Settings.section('advanced').getfloat('plugin_timeout', 30)
+
     def run_plugins (self):
 
         '''
@@ -230,12 +321,9 @@ class Response(object):
         # the user that has sent the message
         can_send = self.check_acl()
 
-        # Load the plugins from the configuration that
+        # Get the plugins from the configuration that
         # should not have ACL rules applied to them
-        config.read(
-            os.path.join(os.path.dirname(__file__), '../settings.ini'))
-        acl_free_plugins = [x.strip() \
-                            for x in config.get('advanced', 'no_acl_plugins', '').split(',')]
+        acl_free_plugins = Settings.get()['no_acl_plugins']
 
         for plugin in self.plugins:
 
@@ -254,22 +342,39 @@ class Response(object):
                     plugin = plugin['name'],
                     message_id = self.response['message_id']))
 
-                logger.debug('Loading plugin: {plugin}'.format(
-                    plugin = plugin['name']))
-
-                # Find and Load the plugin from the file
-                plugin_on_disk = PluginLoader.find_plugin(plugin['name'])
-                loaded_plugin = PluginLoader.load_plugin(plugin_on_disk)
+                # Get the plugin that was loaded at startup
+                loaded_plugin = self.loaded_plugins.get(plugin['name'])
 
-                # If we got None from the load, error out
+                # If the plugin is not loaded, error out
                 if not loaded_plugin:
-                    logger.critical('Loading plugin {name} returned nothing.'.format(
+                    logger.critical('Plugin {name} is not loaded.'.format(
                         name = plugin['name']))
 
                     continue
 
-                # Run the plugins run() method
-                plugin_output = loaded_plugin.run(self.response)
+                # Run the plugins run() method, within
+                # the time it is allowed to take. Plugins that
+                # take a context get one as well.
+                with Deadline.limit(self.get_timeout(plugin['name'], loaded_plugin)):
+                    if plugin.get('context'):
+                        plugin_output = loaded_plugin.run(self.response,
+                                                          self.get_context(plugin['name']))
+                    else:
+                        plugin_output = loaded_plugin.run(self.response)
+
+            except Deadline.PluginTimeout, e:
+
+                logger.error('Plugin {plugin} timed out after {seconds} seconds. Plugin timeouts so far: {count}'.format(
+                    plugin = plugin['name'],
+                    seconds = e.seconds,
+                    count = Deadline.expired()))
+
+                if loaded_plugin.should_reply():
+                    Telegram.send_message(self.sender_information, 'text',
+                                          'Sorry, {plugin} took too long to respond.'.format(
+                                              plugin = plugin['name']))
+
+                continue
 
             except Exception, e:
 
@@ -292,7 +397,4 @@ class Response(object):
 
                 Telegram.send_message(self.sender_information, reply_type, plugin_output)
 
-            # GC the loaded_plugin
-            loaded_plugin = None
-
         return
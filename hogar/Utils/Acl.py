@@ -0,0 +1,237 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Leon Jacobs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' The database backed access control list '''
+
+from hogar.Models.AclUser import AclUser
+from hogar.Utils.Cache import TTLCache
+from hogar.Utils import Settings
+
+import multiprocessing as mp
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Membership lookups are cached per process. Changes bump
+# the shared generation, which every process checks before
+# using its cache. It is created on import, before any
+# workers fork, so that they all share the same value.
+_missing = object()
+_cache = None
+generation = mp.Value('i', 0)
+_seen_generation = 0
+
+def _get_cache ():
+    '''
+        Get Cache
+
+        Returns the membership cache, preparing it with the
+        [acl] cache_size and cache_ttl settings if needed.
+
+        --
+        @return object
+    '''
+
+    global _cache
+
+    if _cache is None:
+        config = Settings.section('acl')
+
+        _cache = TTLCache(
+            max_size = config.getint('cache_size', 1024),
+            ttl = config.getint('cache_ttl', 60))
+
+    return _cache
+
+def get_role (user_id):
+    '''
+        Get Role
+
+        Returns 'owner' or 'user' for a known user_id,
+        or None if the user is unknown.
+
+        --
+        @param  user_id:int     The Telegram ID of the user
+
+        @return str
+    '''
+
+    global _seen_generation
+
+    # Another process changed the ACL, so nothing
+    # we have cached can be trusted
+    if generation.value != _seen_generation:
+        _seen_generation = generation.value
+        _get_cache().clear()
+
+    user_id = int(user_id)
+    role = _get_cache().get(user_id, _missing)
+
+    if role is not _missing:
+        return role
+
+    try:
+        user = AclUser.get(AclUser.user_id == user_id)
+        role = 'owner' if user.owner else 'user'
+
+    except AclUser.DoesNotExist:
+        role = None
+
+    _get_cache().set(user_id, role)
+
+    return role
+
+def is_allowed (user_id):
+    '''
+        Is Allowed
+
+        Check if a user is either an owner or a user.
+
+        --
+        @param  user_id:int     The Telegram ID of the user
+
+        @return bool
+    '''
+
+    return get_role(user_id) is not None
+
+def is_owner (user_id):
+    '''
+        Is Owner
+
+        Check if a user is an owner.
+
+        --
+        @param  user_id:int     The Telegram ID of the user
+
+        @return bool
+    '''
+
+    return get_role(user_id) == 'owner'
+
+def add_user (user_id, first_name = None):
+    '''
+        Add User
+
+        Allow a user to use the bot.
+
+        --
+        @param  user_id:int     The Telegram ID of the user
+        @param  first_name:str  The first name of the user
+
+        @return None
+    '''
+
+    user_id = int(user_id)
+
+    AclUser.get_or_create(user_id = user_id,
+                          defaults = {'first_name': first_name})
+    invalidate(user_id)
+
+    return
+
+def remove_user (user_id):
+    '''
+        Remove User
+
+        Remove a user that is not an owner.
+
+        --
+        @param  user_id:int     The Telegram ID of the user
+
+        @return None
+    '''
+
+    user_id = int(user_id)
+
+    AclUser.delete().where(AclUser.user_id == user_id,
+                           AclUser.owner == False).execute()
+    invalidate(user_id)
+
+    return
+
+def invalidate (user_id = None):
+    '''
+        Invalidate
+
+        Drop a user, or everyone if no user_id is given,
+        from the membership cache. Other processes drop
+        everyone from theirs on their next lookup.
+
+        --
+        @param  user_id:int     The Telegram ID of the user
+
+        @return None
+    '''
+
+    if user_id is None:
+        _get_cache().clear()
+    else:
+        _get_cache().delete(int(user_id))
+
+    with generation.get_lock():
+        generation.value += 1
+
+    return
+
+def import_from_settings ():
+    '''
+        Import From Settings
+
+        Import the owners and users from the [acl] section
+        of settings.ini. Users already known are left as
+        they are, except that listed owners are always
+        made owners. Returns the amount of users that
+        were added or made owners.
+
+        --
+        @return int
+    '''
+
+    settings = Settings.reload()
+    imported = 0
+
+    for user_id in settings['acl_owners']:
+
+        user, created = AclUser.get_or_create(user_id = int(user_id),
+                                              defaults = {'owner': True})
+
+        if created:
+            imported += 1
+
+        elif not user.owner:
+            user.owner = True
+            user.save()
+            imported += 1
+
+    for user_id in settings['acl_users'] - settings['acl_owners']:
+
+        user, created = AclUser.get_or_create(user_id = int(user_id))
+
+        if created:
+            imported += 1
+
+    invalidate()
+
+    logger.info('Imported {count} ACL entries from settings'.format(count = imported))
+
+    return imported
@@ -0,0 +1,303 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Leon Jacobs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' Batched inserts for high volume tables '''
+
+import os
+import time
+import atexit
+import threading
+from peewee import MySQLDatabase
+from hogar.Models.Base import db
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Writers handed out by get_writer(), keyed by model. This
+# module is not reloaded with plugins, so a reloaded plugin
+# gets the writer, timer and buffer it had before.
+_writers = {}
+
+def get_writer (model, batch_size = 100, flush_interval = 5):
+    '''
+        Get Writer
+
+        Returns the BufferedWriter for a model, preparing
+        it if needed. An existing writer takes on the
+        batch_size and flush_interval given.
+
+        --
+        @param  model:object        The peewee Model to insert rows for.
+        @param  batch_size:int      Rows to collect before inserting.
+        @param  flush_interval:int  Maximum seconds a row waits.
+
+        @return BufferedWriter
+    '''
+
+    writer = _writers.get(model.__name__)
+
+    if writer is None:
+        writer = BufferedWriter(model, batch_size, flush_interval)
+        _writers[model.__name__] = writer
+
+    writer.model = model
+    writer.batch_size = batch_size
+    writer.flush_interval = flush_interval
+
+    return writer
+
+class BufferedWriter(object):
+    '''
+        A Buffered Writer
+
+        Collects rows for a model and inserts them in batches,
+        either once batch_size rows are waiting or when the
+        oldest waiting row is flush_interval seconds old.
+        Rows that conflict with an existing unique key are
+        ignored.
+
+        Buffers are local to the process adding rows. Call
+        flush() before a process exits to write what is
+        left. This is registered with atexit as well.
+
+        Rows that fail to insert are retried with the next
+        flush, up to max_attempts flushes. After that they
+        are inserted one by one and those that still fail
+        are dropped, so that a single bad row can not hold
+        up every row after it.
+    '''
+
+    # SQLite allows at most 999 variables per statement
+    chunk_variables = 999
+
+    # Flushes a failed batch is given before its rows
+    # are tried one by one
+    max_attempts = 3
+
+    model = None
+    batch_size = None
+    flush_interval = None
+    rows = None
+    retry = None
+    attempts = 0
+    lock = None
+    timer_pid = None
+
+    def __init__ (self, model, batch_size = 100, flush_interval = 5):
+
+        '''
+            Prepare a new BufferedWriter() instance.
+
+            --
+            @param  model:object        The peewee Model to insert rows for.
+            @param  batch_size:int      Rows to collect before inserting.
+            @param  flush_interval:int  Maximum seconds a row waits.
+
+            @return None
+        '''
+
+        self.model = model
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows = []
+        self.retry = []
+        self.lock = threading.Lock()
+
+        atexit.register(self.flush)
+
+        return
+
+    def _start_timer (self):
+
+        '''
+            Start Timer
+
+            Start the thread that flushes on the time threshold,
+            once for every process that adds rows.
+
+            --
+            @return None
+        '''
+
+        if self.timer_pid == os.getpid():
+            return
+
+        self.timer_pid = os.getpid()
+
+        timer = threading.Thread(target = self._timer)
+        timer.daemon = True
+        timer.start()
+
+        return
+
+    def _timer (self):
+
+        '''
+            Timer
+
+            Flush waiting rows every flush_interval seconds.
+
+            --
+            @return None
+        '''
+
+        while True:
+
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def add (self, row):
+
+        '''
+            Add
+
+            Add a row to the buffer, flushing if the buffer
+            is full.
+
+            --
+            @param  row:dict    The field values of the row.
+
+            @return None
+        '''
+
+        self._start_timer()
+
+        with self.lock:
+            self.rows.append(row)
+            full = len(self.rows) >= self.batch_size
+
+        if full:
+            self.flush()
+
+        return
+
+    def _insert (self, rows):
+
+        '''
+            Insert
+
+            Insert rows, ignoring those that conflict with an
+            existing unique key. peewee only knows the SQLite
+            'INSERT OR IGNORE', so it is rewritten to 'INSERT
+            IGNORE' for MySQL.
+
+            --
+            @param  rows:list   The field values of the rows.
+
+            @return None
+        '''
+
+        query = self.model.insert_many(rows).on_conflict('IGNORE')
+
+        if not isinstance(db, MySQLDatabase):
+            query.execute()
+            return
+
+        sql, params = query.sql()
+        db.execute_sql(sql.replace('INSERT OR IGNORE INTO', 'INSERT IGNORE INTO', 1), params)
+
+        return
+
+    def _insert_each (self, rows):
+
+        '''
+            Insert Each
+
+            Insert rows one by one, dropping those that fail.
+
+            --
+            @param  rows:list   The field values of the rows.
+
+            @return int     The amount of rows inserted
+        '''
+
+        inserted = 0
+
+        for row in rows:
+
+            try:
+                with db.atomic():
+                    self._insert([row])
+
+                inserted += 1
+
+            except Exception, e:
+                logger.error('Dropping a {model} row that failed to insert: {error}'.format(
+                    model = self.model.__name__, error = str(e)))
+
+        return inserted
+
+    def flush (self):
+
+        '''
+            Flush
+
+            Insert every waiting row, along with those from
+            earlier flushes that failed. Failures are logged
+            and never raised.
+
+            --
+            @return int     The amount of rows inserted
+        '''
+
+        with self.lock:
+            rows, self.rows = self.retry + self.rows, []
+            self.retry = []
+            attempts, self.attempts = self.attempts + 1, 0
+
+        if not rows:
+            return 0
+
+        chunk_size = max(1, self.chunk_variables // len(rows[0]))
+
+        try:
+
+            with db.atomic():
+                for i in range(0, len(rows), chunk_size):
+                    self._insert(rows[i:i + chunk_size])
+
+        except Exception, e:
+
+            if attempts < self.max_attempts:
+
+                logger.warning('Flushing {count} {model} rows failed, will retry: {error}'.format(
+                    count = len(rows), model = self.model.__name__, error = str(e)))
+
+                # Nothing was written. Keep the rows aside for the
+                # next flush, so that they do not count towards a
+                # full buffer and trigger a flush on every add().
+                with self.lock:
+                    self.retry[:0] = rows
+                    self.attempts = attempts
+
+                return 0
+
+            logger.error('Flushing {count} {model} rows failed {attempts} times, inserting them one by one: {error}'.format(
+                count = len(rows), model = self.model.__name__, attempts = attempts, error = str(e)))
+
+            return self._insert_each(rows)
+
+        logger.debug('Flushed {count} {model} rows'.format(
+            count = len(rows), model = self.model.__name__))
+
+        return len(rows)
@@ -0,0 +1,151 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Leon Jacobs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' Small in-process caches '''
+
+import time
+import threading
+from collections import OrderedDict
+
+class TTLCache(object):
+    '''
+        A TTL Cache
+
+        A size bounded, least recently used cache where
+        entries also expire after a time to live. The
+        cache is local to the process using it.
+    '''
+
+    max_size = None
+    ttl = None
+    entries = None
+    lock = None
+
+    def __init__ (self, max_size = 1024, ttl = 60):
+
+        '''
+            Prepare a new TTLCache() instance.
+
+            --
+            @param  max_size:int    The maximum amount of entries to keep.
+            @param  ttl:int         Seconds before an entry expires. None never expires.
+
+            @return None
+        '''
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        return
+
+    def get (self, key, default = None):
+
+        '''
+            Get
+
+            Returns the cached value for key, or default
+            if it is not cached or has expired.
+
+            --
+            @param  key:mixed       The key to look up.
+            @param  default:mixed   Returned when the key is not cached.
+
+            @return mixed
+        '''
+
+        with self.lock:
+
+            if key not in self.entries:
+                return default
+
+            expires, value = self.entries.pop(key)
+
+            if expires is not None and expires < time.time():
+                return default
+
+            # Re-insert to mark the entry as most recently used
+            self.entries[key] = (expires, value)
+
+            return value
+
+    def set (self, key, value):
+
+        '''
+            Set
+
+            Cache a value for key, evicting the least
+            recently used entry if the cache is full.
+
+            --
+            @param  key:mixed       The key to cache the value for.
+            @param  value:mixed     The value to cache.
+
+            @return None
+        '''
+
+        expires = time.time() + self.ttl if self.ttl is not None else None
+
+        with self.lock:
+
+            self.entries.pop(key, None)
+            self.entries[key] = (expires, value)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last = False)
+
+        return
+
+    def delete (self, key):
+
+        '''
+            Delete
+
+            Remove a key from the cache.
+
+            --
+            @param  key:mixed   The key to remove.
+
+            @return None
+        '''
+
+        with self.lock:
+            self.entries.pop(key, None)
+
+        return
+
+    def clear (self):
+
+        '''
+            Clear
+
+            Remove every entry from the cache.
+
+            --
+            @return None
+        '''
+
+        with self.lock:
+            self.entries.clear()
+
+        return
@@ -0,0 +1,130 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Leon Jacobs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' The context plugins are run with '''
+
+from hogar.Utils import Settings
+from hogar.Utils import Http
+from hogar.Utils.Tokenizer import empty
+import logging
+
+class Context(object):
+    '''
+        A Plugin Context
+
+        Everything a plugin may need to handle a message,
+        prepared once for the message and shared by the
+        plugins that run for it.
+    '''
+
+    message = None
+    message_type = None
+    plugin = None
+    mention = None
+    command = None
+    bot = None
+    args = None
+    logger = None
+
+    def __init__ (self, message, message_type, plugin, tokens = empty):
+
+        '''
+            Prepare a new Context() instance.
+
+            --
+            @param  message:dict        The message received.
+            @param  message_type:str    The type of the message.
+            @param  plugin:str          The name of the plugin to run.
+            @param  tokens:Tokens       The tokenized text of the message.
+
+            @return None
+        '''
+
+        self.message = message
+        self.message_type = message_type
+        self.plugin = plugin
+        self.mention, self.command, self.bot, self.args = tokens
+        self.logger = logging.getLogger(plugin)
+
+        return
+
+    @property
+    def http (self):
+
+        '''
+            HTTP
+
+            A requests.Session with pooled keep-alive connections,
+            shared by all of the plugins in this process.
+
+            --
+            @return object
+        '''
+
+        return Http.session('plugins')
+
+    @property
+    def db (self):
+
+        '''
+            DB
+
+            The database the models use.
+
+            --
+            @return object
+        '''
+
+        # The models connect when they are imported, so they
+        # are only imported once a plugin asks for them
+        from hogar.Models.Base import db
+
+        return db
+
+    @property
+    def settings (self):
+
+        '''
+            Settings
+
+            The settings section named after the plugin.
+
+            --
+            @return Section
+        '''
+
+        return Settings.section(self.plugin.lower())
+
+    def section (self, name):
+
+        '''
+            Section
+
+            Any other section of the settings.
+
+            --
+            @param  name:str    The name of the section
+
+            @return Section
+        '''
+
+        return Settings.section(name)
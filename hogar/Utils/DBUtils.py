@@ -26,7 +26,11 @@ from hogar.Models.LearnValue import LearnValue
 from hogar.Models.Logger import Logger
 from hogar.Models.RemindOnce import RemindOnce
 from hogar.Models.RemindRecurring import RemindRecurring
+from hogar.Models.AclUser import AclUser
+from hogar.Utils import Acl
+from playhouse.migrate import SchemaMigrator, migrate
 
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -41,15 +45,77 @@ class DB:
             Setup Database Tables
 
             The primary purpose of this method is to prepare the tables
-            needed in the database.
+            needed in the database. ACL entries from settings.ini are
+            imported as well.
         '''
 
         # create the tables if they do not exist
         with db.execution_context():
             logger.debug('Connected to database: %s' % db.database)
             db.create_tables([
-                LearnKey, LearnValue, Logger, RemindOnce, RemindRecurring
+                LearnKey, LearnValue, Logger, RemindOnce, RemindRecurring, AclUser
             ], True)
             logger.debug('Tables synced')
 
+            # Bring older reminder tables up to date
+            DB.migrate_reminders()
+
+            # ACLs used to live in settings.ini. Bring any
+            # owners and users from there along.
+            Acl.import_from_settings()
+
+        return
+
+    @staticmethod
+    def migrate_reminders ():
+        '''
+            Migrate Reminders
+
+            Reminders used to only keep the original message as
+            JSON. Add the chat and sender columns to tables that
+            predate them and backfill them from that JSON. Indexes
+            declared on the models that are missing are added too.
+
+            --
+            @return void
+        '''
+
+        migrator = SchemaMigrator.from_database(db)
+
+        for model in [RemindOnce, RemindRecurring]:
+
+            table = model._meta.db_table
+            existing = [c.name for c in db.get_columns(table)]
+            operations = []
+
+            for name in ['chat_id', 'from_first_name', 'from_last_name', 'from_username']:
+                if name not in existing:
+                    operations.append(
+                        migrator.add_column(table, name, model._meta.fields[name]))
+
+            indexes = [tuple(i.columns) for i in db.get_indexes(table)]
+
+            for columns, unique in model._meta.indexes:
+                if tuple(columns) not in indexes:
+                    operations.append(migrator.add_index(table, columns, unique))
+
+            if operations:
+                logger.debug('Migrating {t}'.format(t = table))
+                migrate(*operations)
+
+            # Backfill rows that have not been populated yet
+            pending = list(model.select().where(model.chat_id >> None,
+                                                ~(model.orig_message >> None)))
+
+            with db.atomic():
+                for reminder in pending:
+
+                    orig_message = json.loads(reminder.orig_message)
+                    model.update(
+                        chat_id = orig_message['chat']['id'],
+                        from_first_name = orig_message['from'].get('first_name'),
+                        from_last_name = orig_message['from'].get('last_name'),
+                        from_username = orig_message['from'].get('username')
+                    ).where(model.id == reminder.id).execute()
+
         return
@@ -0,0 +1,168 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Leon Jacobs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' Time limits for plugins '''
+
+import multiprocessing as mp
+from contextlib import contextmanager
+import signal
+import time
+import sys
+
+# The amount of plugin runs that went past their deadline.
+# This is created on import, before any workers fork, so
+# that every process counts into the same value.
+timeouts = mp.Value('i', 0)
+
+# When the current limit expires, as a shared value the
+# dispatcher watches to recycle workers that overrun it
+_deadline = None
+
+class PluginTimeout(BaseException):
+    '''
+        Raised when a plugin runs past its deadline.
+
+        Like gevent.Timeout, this is not an Exception so that
+        plugins catching Exception can not swallow it.
+    '''
+
+    seconds = None
+
+    def __init__ (self, seconds):
+
+        super(PluginTimeout, self).__init__(
+            'Timed out after {seconds} seconds'.format(seconds = seconds))
+        self.seconds = seconds
+
+def track (deadline):
+    '''
+        Track
+
+        Record limits in this process in deadline, so
+        that someone else may act should a limit not
+        be enforced in time.
+
+        --
+        @param  deadline:object     A multiprocessing.Value('d')
+
+        @return None
+    '''
+
+    global _deadline
+    _deadline = deadline
+
+    return
+
+def expired ():
+    '''
+        Expired
+
+        Count a plugin run that went past its deadline.
+
+        --
+        @return int     The amount of timeouts so far
+    '''
+
+    with timeouts.get_lock():
+        timeouts.value += 1
+        return timeouts.value
+
+def _green ():
+    '''
+        Green
+
+        Check if we are running with a gevent patched
+        standard library.
+
+        --
+        @return bool
+    '''
+
+    if 'gevent.monkey' not in sys.modules:
+        return False
+
+    return sys.modules['gevent.monkey'].is_module_patched('time')
+
+@contextmanager
+def limit (seconds):
+    '''
+        Limit
+
+        Raise PluginTimeout in the body of the with block
+        once it has run for seconds. Greenlets are limited
+        with a gevent.Timeout, anything else with SIGALRM.
+
+        Python only allows signal handlers to be set in what
+        it considers the main thread, which is also the case
+        for processes forked from another thread. Elsewhere
+        the body is not interrupted, but the deadline is
+        still published for whoever tracks it to act on.
+
+        --
+        @param  seconds:float   The time limit. 0 or None for no limit.
+
+        @return None
+    '''
+
+    if not seconds or seconds <= 0:
+        yield
+        return
+
+    if _green():
+        import gevent
+
+        with gevent.Timeout(seconds, PluginTimeout(seconds)):
+            yield
+
+        return
+
+    def alarm (signum, frame):
+        raise PluginTimeout(seconds)
+
+    if _deadline is not None:
+        _deadline.value = time.time() + seconds
+
+    # Ask signal itself, rather than threading, if we may
+    # set a handler here. threading keeps thinking the
+    # thread a process was forked from is its main thread.
+    try:
+        previous = signal.signal(signal.SIGALRM, alarm)
+        armed = True
+
+    except ValueError:
+        armed = False
+
+    if armed:
+        signal.setitimer(signal.ITIMER_REAL, seconds)
+
+    try:
+        yield
+
+    finally:
+        if armed:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+        if _deadline is not None:
+            _deadline.value = 0
+
+    return
@@ -0,0 +1,675 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Leon Jacobs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import multiprocessing as mp
+import threading
+import signal
+import random
+import time
+import os
+import sys
+import logging
+
+from hogar.Utils import PluginLoader
+from hogar.Utils import Settings
+from hogar.Utils import Deadline
+
+logger = logging.getLogger(__name__)
+
+def _handle (handler, update, command_map, plugins = None):
+    '''
+        Handle
+
+        Run the handler for a single update. The handler is
+        responsible for its own error reporting. We only make
+        sure that a failing update does not take the worker
+        or greenlet down too.
+
+        --
+        @param  handler:function    The function that processes an update.
+        @param  update:dict         The parsed Telegram update object.
+        @param  command_map:dict    The parsed commands available.
+        @param  plugins:list        The names of the plugins to run. None
+                                    runs all of the applicable ones.
+
+        @return None
+    '''
+
+    try:
+        handler(update, command_map, plugins)
+
+    except Exception, e:
+        logger.error('Handler failed for update {id}: {error}'.format(
+            id = update.get('update_id'),
+            error = str(e)))
+
+    return
+
+def _worker (queue, handler, command_map, generation, settings_generation, deadline):
+    '''
+        Worker
+
+        The main loop of a long lived dispatch worker. Updates
+        are read off the shared queue and handed to the
+        handler until a None sentinel is received.
+
+        When the shared plugin generation moves on, the worker
+        reloads its plugins before handling the next update.
+        The update being handled at that time completes with
+        the plugins it started with. The same goes for the
+        shared settings generation and the settings snapshot.
+
+        Plugins are shut down when the worker exits.
+
+        The deadline of the plugin being run is kept in the
+        shared deadline value for the dispatcher to watch.
+
+        --
+        @param  queue:object                The multiprocessing.Queue to read from.
+        @param  handler:function            The function that processes an update.
+        @param  command_map:dict            The parsed commands available.
+        @param  generation:object           The shared multiprocessing.Value plugin generation.
+        @param  settings_generation:object  The shared multiprocessing.Value settings generation.
+        @param  deadline:object             The shared multiprocessing.Value plugin deadline.
+
+        @return None
+    '''
+
+    logger.debug('Dispatch worker started')
+    seen_generation = generation.value
+    seen_settings_generation = settings_generation.value
+
+    # Exit cleanly when terminated, so that plugins are shut down
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    Deadline.track(deadline)
+
+    # Workers are forked with the random state of their
+    # parent, and would all make the same choices
+    random.seed()
+
+    try:
+
+        while True:
+
+            item = queue.get()
+
+            # A None on the queue is our signal to stop
+            if item is None:
+                logger.debug('Dispatch worker received stop sentinel')
+                break
+
+            update, plugins = item
+
+            if generation.value != seen_generation:
+                seen_generation = generation.value
+
+                try:
+                    command_map = PluginLoader.reload_plugins()
+
+                except Exception, e:
+                    logger.error('Worker failed to reload plugins, keeping the loaded ones: {error}'.format(
+                        error = str(e)))
+
+            if settings_generation.value != seen_settings_generation:
+                seen_settings_generation = settings_generation.value
+                Settings.reload()
+
+            _handle(handler, update, command_map, plugins)
+
+    finally:
+        PluginLoader.shutdown_plugins()
+
+    return
+
+class Dispatcher(object):
+    '''
+        The Hogar Dispatcher
+
+        A long lived pool of worker processes that consume
+        updates from a bounded queue. Submitting an update
+        blocks once the queue is full, which applies
+        backpressure to whoever is producing updates.
+
+        Workers that are still running a plugin grace seconds
+        after its deadline could not be interrupted, and are
+        killed and replaced.
+    '''
+
+    handler = None
+    command_map = None
+    workers = None
+    queue_size = None
+    queue = None
+    processes = None
+    deadlines = None
+    lock = None
+    generation = None
+    settings_generation = None
+    stopping = False
+    grace = 5
+
+    def __init__ (self, handler, command_map, workers = 4, queue_size = 100):
+
+        '''
+            Prepare a new Dispatcher() instance.
+
+            --
+            @param  handler:function    The function that processes an update.
+            @param  command_map:dict    The parsed commands available.
+            @param  workers:int         The amount of worker processes.
+            @param  queue_size:int      The maximum updates waiting for a worker.
+
+            @return None
+        '''
+
+        if workers < 1:
+            raise ValueError('A Dispatcher needs at least 1 worker.')
+
+        self.handler = handler
+        self.command_map = command_map
+        self.workers = workers
+        self.queue_size = queue_size
+        self.processes = []
+        self.deadlines = {}
+        self.lock = threading.Lock()
+        self.generation = mp.Value('i', 0)
+        self.settings_generation = mp.Value('i', 0)
+
+        return
+
+    def _spawn (self):
+
+        '''
+            Spawn
+
+            Start a new worker process and record it.
+
+            --
+            @return None
+        '''
+
+        deadline = mp.Value('d', 0)
+
+        process = mp.Process(target = _worker,
+                             args = (self.queue, self.handler, self.command_map,
+                                     self.generation, self.settings_generation, deadline,))
+        process.daemon = True
+        process.start()
+
+        self.processes.append(process)
+        self.deadlines[process.pid] = deadline
+
+        logger.debug('Started dispatch worker with PID {pid}'.format(
+            pid = process.pid))
+
+        return
+
+    def _reap (self):
+
+        '''
+            Reap
+
+            Replace any workers that have died since we last
+            checked, killing those that overran a plugin deadline
+            first. Updates may be submitted from more than one
+            thread, so this is done under a lock.
+
+            --
+            @return None
+        '''
+
+        with self.lock:
+
+            if self.stopping:
+                return
+
+            now = time.time()
+
+            for process in self.processes:
+
+                deadline = self.deadlines[process.pid].value
+
+                if deadline and now > deadline + self.grace and process.is_alive():
+
+                    logger.error('Dispatch worker {pid} overran a plugin deadline. Plugin timeouts so far: {count}'.format(
+                        pid = process.pid,
+                        count = Deadline.expired()))
+
+                    os.kill(process.pid, signal.SIGKILL)
+                    process.join()
+
+            for process in [p for p in self.processes if not p.is_alive()]:
+
+                logger.warning('Dispatch worker {pid} exited with code {code}. Replacing it'.format(
+                    pid = process.pid,
+                    code = process.exitcode))
+
+                self.processes.remove(process)
+                del self.deadlines[process.pid]
+                self._spawn()
+
+        return
+
+    def _supervise (self):
+
+        '''
+            Supervise
+
+            Reap workers every second until we are stopped,
+            so that workers are replaced even while no
+            updates are submitted.
+
+            --
+            @return None
+        '''
+
+        while not self.stopping:
+
+            time.sleep(1)
+            self._reap()
+
+        return
+
+    def start (self):
+
+        '''
+            Start
+
+            Prepare the queue and start the worker processes.
+
+            --
+            @return None
+        '''
+
+        self.queue = mp.Queue(maxsize = self.queue_size)
+        self.stopping = False
+
+        for _ in range(self.workers):
+            self._spawn()
+
+        supervisor = threading.Thread(target = self._supervise)
+        supervisor.daemon = True
+        supervisor.start()
+
+        logger.info('Dispatcher started with {workers} workers and a queue size of {size}'.format(
+            workers = self.workers,
+            size = self.queue_size))
+
+        return
+
+    def submit (self, update, plugins = None):
+
+        '''
+            Submit
+
+            Queue an update for processing. This call blocks
+            while the queue is full.
+
+            --
+            @param  update:dict     The parsed Telegram update object.
+            @param  plugins:list    The names of the plugins to run. None
+                                    runs all of the applicable ones.
+
+            @return None
+        '''
+
+        self._reap()
+        self.queue.put((update, plugins))
+
+        return
+
+    def reload (self, command_map):
+
+        '''
+            Reload
+
+            Tell workers that plugins changed. Each worker
+            reloads its plugins before its next update, and
+            workers started from now on use command_map.
+
+            --
+            @param  command_map:dict    The newly prepared command map.
+
+            @return None
+        '''
+
+        with self.lock:
+
+            self.command_map = command_map
+
+            with self.generation.get_lock():
+                self.generation.value += 1
+
+        return
+
+    def reload_settings (self):
+
+        '''
+            Reload Settings
+
+            Tell workers to reload their settings snapshot
+            before their next update.
+
+            --
+            @return None
+        '''
+
+        with self.settings_generation.get_lock():
+            self.settings_generation.value += 1
+
+        return
+
+    def stop (self):
+
+        '''
+            Stop
+
+            Ask every worker to stop once the queue has
+            drained and wait for them to exit.
+
+            --
+            @return None
+        '''
+
+        with self.lock:
+            self.stopping = True
+
+        for _ in self.processes:
+            self.queue.put(None)
+
+        for process in self.processes:
+            process.join()
+
+        self.processes = []
+        self.deadlines = {}
+        logger.info('Dispatcher stopped')
+
+        return
+
+class GreenDispatcher(object):
+    '''
+        The Hogar Green Dispatcher
+
+        Used by the gevent runtime. Every update is handled in
+        its own greenlet within the current process, so plugins
+        waiting on the network simply yield to one another.
+        A bounded greenlet pool caps the concurrency, and
+        submitting blocks once it is full.
+
+        This dispatcher expects the standard library to
+        have been monkey patched by gevent already.
+    '''
+
+    handler = None
+    command_map = None
+    concurrency = None
+    pool = None
+
+    def __init__ (self, handler, command_map, concurrency = 1000):
+
+        '''
+            Prepare a new GreenDispatcher() instance.
+
+            --
+            @param  handler:function    The function that processes an update.
+            @param  command_map:dict    The parsed commands available.
+            @param  concurrency:int     The maximum updates handled at once.
+
+            @return None
+        '''
+
+        if concurrency < 1:
+            raise ValueError('A GreenDispatcher needs a concurrency of at least 1.')
+
+        self.handler = handler
+        self.command_map = command_map
+        self.concurrency = concurrency
+
+        return
+
+    def start (self):
+
+        '''
+            Start
+
+            Prepare the greenlet pool.
+
+            --
+            @return None
+        '''
+
+        import gevent.pool
+        self.pool = gevent.pool.Pool(self.concurrency)
+
+        logger.info('Green dispatcher started with a concurrency of {concurrency}'.format(
+            concurrency = self.concurrency))
+
+        return
+
+    def submit (self, update, plugins = None):
+
+        '''
+            Submit
+
+            Spawn a greenlet for an update. This call blocks
+            while the pool is full.
+
+            --
+            @param  update:dict     The parsed Telegram update object.
+            @param  plugins:list    The names of the plugins to run. None
+                                    runs all of the applicable ones.
+
+            @return None
+        '''
+
+        self.pool.spawn(_handle, self.handler, update, self.command_map, plugins)
+
+        return
+
+    def reload (self, command_map):
+
+        '''
+            Reload
+
+            Use a new command map for updates submitted from
+            now on. Plugins are reloaded in this process
+            already, so there is nothing else to do.
+
+            --
+            @param  command_map:dict    The newly prepared command map.
+
+            @return None
+        '''
+
+        self.command_map = command_map
+
+        return
+
+    def reload_settings (self):
+
+        '''
+            Reload Settings
+
+            Greenlets share the settings snapshot of this
+            process, so there is nothing to do.
+
+            --
+            @return None
+        '''
+
+        return
+
+    def stop (self):
+
+        '''
+            Stop
+
+            Wait for running greenlets to complete.
+
+            --
+            @return None
+        '''
+
+        self.pool.join()
+        logger.info('Green dispatcher stopped')
+
+        return
+
+class LaneDispatcher(object):
+    '''
+        The Hogar Lane Dispatcher
+
+        Plugins run in one of a few lanes, each with a
+        dispatcher of its own. An update is split up by the
+        lanes of the plugins that apply to it and handed to
+        each of those, so that slow plugins only hold up
+        other plugins in the same lane.
+    '''
+
+    lanes = None
+    router = None
+    command_map = None
+
+    def __init__ (self, lanes, router, command_map):
+
+        '''
+            Prepare a new LaneDispatcher() instance.
+
+            --
+            @param  lanes:dict          Dispatchers keyed by lane name.
+            @param  router:function     Returns the plugin names per lane
+                                        for an update and command map.
+            @param  command_map:dict    The parsed commands available.
+
+            @return None
+        '''
+
+        self.lanes = lanes
+        self.router = router
+        self.command_map = command_map
+
+        return
+
+    def start (self):
+
+        '''
+            Start
+
+            Start the dispatcher of every lane.
+
+            --
+            @return None
+        '''
+
+        for name, dispatcher in self.lanes.items():
+            logger.info('Starting the {name} lane'.format(name = name))
+            dispatcher.start()
+
+        return
+
+    def submit (self, update):
+
+        '''
+            Submit
+
+            Hand an update to the lanes of the plugins that
+            apply to it. This call blocks while the queue of
+            one of those lanes is full.
+
+            --
+            @param  update:dict     The parsed Telegram update object.
+
+            @return None
+        '''
+
+        try:
+            routes = self.router(update, self.command_map)
+
+        except Exception, e:
+            logger.error('Routing update {id} failed: {error}'.format(
+                id = update.get('update_id'),
+                error = str(e)))
+            return
+
+        if not routes:
+            logger.debug('No plugins matched update {id}'.format(
+                id = update.get('update_id')))
+            return
+
+        for name, plugins in routes.items():
+            self.lanes[name].submit(update, plugins)
+
+        return
+
+    def reload (self, command_map):
+
+        '''
+            Reload
+
+            Route with a new command map and hand it to
+            every lane.
+
+            --
+            @param  command_map:dict    The newly prepared command map.
+
+            @return None
+        '''
+
+        self.command_map = command_map
+
+        for dispatcher in self.lanes.values():
+            dispatcher.reload(command_map)
+
+        return
+
+    def reload_settings (self):
+
+        '''
+            Reload Settings
+
+            Have every lane reload its settings.
+
+            --
+            @return None
+        '''
+
+        for dispatcher in self.lanes.values():
+            dispatcher.reload_settings()
+
+        return
+
+    def stop (self):
+
+        '''
+            Stop
+
+            Stop the dispatcher of every lane.
+
+            --
+            @return None
+        '''
+
+        for dispatcher in self.lanes.values():
+            dispatcher.stop()
+
+        return
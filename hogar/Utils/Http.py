@@ -0,0 +1,74 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Leon Jacobs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' Pooled HTTP sessions '''
+
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from hogar.static import values as static_values
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sessions are keyed by process and name. Pooled connections
+# must not be shared with a forked child, so every process
+# prepares its own sessions.
+_sessions = {}
+
+def session (name, pool_size = 10, retries = 0):
+    '''
+        Session
+
+        Returns a requests.Session for name with a pool of
+        keep-alive connections, preparing it if this process
+        does not have one yet.
+
+        --
+        @param  name:str        The name of the session.
+        @param  pool_size:int   The maximum connections kept per host.
+        @param  retries:int     Retries for failed connection attempts.
+
+        @return object
+    '''
+
+    key = (os.getpid(), name)
+
+    if key in _sessions:
+        return _sessions[key]
+
+    adapter = HTTPAdapter(pool_connections = pool_size,
+                          pool_maxsize = pool_size,
+                          max_retries = retries)
+
+    s = requests.Session()
+    s.mount('https://', adapter)
+    s.mount('http://', adapter)
+    s.headers.update(static_values.headers)
+    s.verify = static_values.verify_ssl
+
+    logger.debug('Prepared {name} HTTP session with a pool size of {size}'.format(
+        name = name, size = pool_size))
+
+    _sessions[key] = s
+
+    return s
@@ -0,0 +1,400 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Leon Jacobs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' A rate limited delivery queue for outbound Telegram messages '''
+
+import os
+import time
+import Queue
+import threading
+import multiprocessing as mp
+from collections import deque
+from hogar.Utils.RateLimit import TokenBucket
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# How often, in seconds, the queue depth is reported and
+# idle chat buckets are pruned
+report_interval = 60
+
+# Messages are put on _queue from any process. The process
+# that started the outbox moves them to _pending, from where
+# they are released to the senders via _ready as the rate
+# limits allow.
+_queue = None
+_shared = False
+_pid = None
+_pending = deque()
+_ready = Queue.Queue()
+_lock = threading.Lock()
+
+_deliver = None
+_global_bucket = None
+_chat_buckets = {}
+_chat_rate = None
+_group_rate = None
+_max_retries = None
+
+def retryable (response):
+    '''
+        Retryable
+
+        Check if a response from the Telegram API means
+        that the message should be sent again later.
+
+        --
+        @param  response:object     The requests response
+
+        @return bool
+    '''
+
+    return response.status_code == 429 or response.status_code >= 500
+
+def running ():
+    '''
+        Running
+
+        Check if messages from this process can be
+        handed to the outbox.
+
+        --
+        @return bool
+    '''
+
+    return _queue is not None and (_shared or os.getpid() == _pid)
+
+def depth ():
+    '''
+        Depth
+
+        Returns the amount of messages waiting to be
+        delivered. Only known in the process that
+        started the outbox.
+
+        --
+        @return int
+    '''
+
+    with _lock:
+        pending = len(_pending)
+
+    return pending + _ready.qsize() + _queue.qsize()
+
+def put (recipient, message_type, message):
+    '''
+        Put
+
+        Queue a message for delivery.
+
+        --
+        @param  recipient:dict      A dictionary of recipient information
+        @param  message_type:str    The type of message to send
+        @param  message:mixed       The message to be sent
+
+        @return None
+    '''
+
+    _queue.put({
+        'recipient': recipient,
+        'message_type': message_type,
+        'message': message,
+        'attempts': 0,
+        'not_before': 0
+    })
+
+    return
+
+def _chat_bucket (chat_id):
+    '''
+        Chat Bucket
+
+        Returns the token bucket of a chat. Group chats
+        have negative IDs and a lower rate.
+
+        --
+        @param  chat_id:int     The Telegram chat ID
+
+        @return object
+    '''
+
+    if chat_id not in _chat_buckets:
+        _chat_buckets[chat_id] = TokenBucket(_group_rate if chat_id < 0 else _chat_rate)
+
+    return _chat_buckets[chat_id]
+
+def _next_wait ():
+    '''
+        Next Wait
+
+        Returns the seconds until a pending message may
+        be released, at most 1.
+
+        --
+        @return float
+    '''
+
+    now = time.time()
+    wait = 1.0
+
+    with _lock:
+
+        for item in _pending:
+            wait = min(wait, max(item['not_before'] - now,
+                                 _chat_bucket(item['recipient']['id']).wait_time(now),
+                                 _global_bucket.wait_time(now)))
+
+    return max(wait, 0.01)
+
+def _release ():
+    '''
+        Release
+
+        Hand pending messages to the senders as far as the
+        global and per chat rate limits allow. Messages to
+        the same chat are released in the order they were
+        queued.
+
+        --
+        @return None
+    '''
+
+    now = time.time()
+    blocked = set()
+    keep = deque()
+
+    with _lock:
+
+        while _pending:
+
+            item = _pending.popleft()
+            chat_id = item['recipient']['id']
+
+            if chat_id in blocked or item['not_before'] > now \
+                    or _chat_bucket(chat_id).wait_time(now) > 0:
+                blocked.add(chat_id)
+                keep.append(item)
+                continue
+
+            if not _global_bucket.consume(now):
+                keep.append(item)
+                break
+
+            _chat_bucket(chat_id).consume(now)
+            _ready.put(item)
+
+        keep.extend(_pending)
+        _pending.clear()
+        _pending.extend(keep)
+
+    return
+
+def _prune ():
+    '''
+        Prune
+
+        Forget the buckets of chats that have been idle
+        long enough for their bucket to be full again.
+
+        --
+        @return None
+    '''
+
+    with _lock:
+
+        now = time.time()
+        for chat_id in [c for c, b in _chat_buckets.items() if b.is_idle(now)]:
+            del _chat_buckets[chat_id]
+
+    return
+
+def _schedule ():
+    '''
+        Schedule
+
+        The main loop of the outbox. Moves queued messages
+        to the pending list and releases them.
+
+        --
+        @return None
+    '''
+
+    last_report = time.time()
+
+    while True:
+
+        try:
+            item = _queue.get(True, _next_wait())
+
+            with _lock:
+                _pending.append(item)
+
+                # Take whatever else is waiting too
+                while True:
+                    _pending.append(_queue.get_nowait())
+
+        except Queue.Empty:
+            pass
+
+        _release()
+
+        if time.time() - last_report >= report_interval:
+            last_report = time.time()
+            _prune()
+
+            queued = depth()
+            if queued > 0:
+                logger.info('Outbox depth is {depth} messages'.format(depth = queued))
+
+    return
+
+def _retry (item, delay):
+    '''
+        Retry
+
+        Put a message that failed to send back in front of
+        the pending list, or drop it if it has been tried
+        too often already.
+
+        --
+        @param  item:dict       The queued message
+        @param  delay:float     Seconds to wait before retrying
+
+        @return None
+    '''
+
+    item['attempts'] += 1
+
+    if item['attempts'] > _max_retries:
+        logger.error('Dropping {message_type} message to {chat_id} after {attempts} attempts'.format(
+            message_type = item['message_type'],
+            chat_id = item['recipient']['id'],
+            attempts = item['attempts']))
+        return
+
+    item['not_before'] = time.time() + delay
+
+    with _lock:
+        _pending.appendleft(item)
+
+    return
+
+def _send ():
+    '''
+        Send
+
+        The main loop of a sender. Delivers released messages,
+        honouring any retry_after the API asks for, and backs
+        off exponentially on other temporary failures.
+
+        --
+        @return None
+    '''
+
+    while True:
+
+        item = _ready.get()
+        backoff = min(2 ** item['attempts'], 60)
+
+        try:
+            response = _deliver(item['recipient'], item['message_type'], item['message'])
+
+        except Exception, e:
+            logger.warning('Delivering to {chat_id} failed with: {error}'.format(
+                chat_id = item['recipient']['id'], error = str(e)))
+            _retry(item, backoff)
+            continue
+
+        # Some message types are not sent at all
+        if response is None:
+            continue
+
+        if response.status_code == 429:
+
+            try:
+                retry_after = response.json()['parameters']['retry_after']
+
+            except (ValueError, KeyError, TypeError):
+                retry_after = backoff
+
+            logger.warning('Rate limited sending to {chat_id}. Retrying after {retry_after}s'.format(
+                chat_id = item['recipient']['id'], retry_after = retry_after))
+
+            with _lock:
+                _chat_bucket(item['recipient']['id']).pause(retry_after)
+
+            _retry(item, retry_after)
+
+        elif retryable(response):
+            _retry(item, backoff)
+
+        elif response.status_code != 200:
+            logger.error('Delivering to {chat_id} failed with HTTP code {code}. Not retrying'.format(
+                chat_id = item['recipient']['id'], code = response.status_code))
+
+    return
+
+def start (deliver, shared = True, senders = 4, global_per_second = 30,
+           chat_per_second = 1, group_per_minute = 20, max_retries = 5):
+    '''
+        Start
+
+        Start the outbox in this process. When shared, the
+        queue may be used by processes forked after this.
+        Otherwise only this process may queue messages and
+        others keep sending directly.
+
+        --
+        @param  deliver:function        Sends a message, returning the response.
+        @param  shared:bool             Use a multiprocessing queue.
+        @param  senders:int             The amount of sender threads.
+        @param  global_per_second:int   The overall send rate.
+        @param  chat_per_second:int     The send rate per private chat.
+        @param  group_per_minute:int    The send rate per group chat.
+        @param  max_retries:int         Attempts before a message is dropped.
+
+        @return None
+    '''
+
+    global _queue, _shared, _pid, _deliver, _global_bucket, \
+        _chat_rate, _group_rate, _max_retries
+
+    _queue = mp.Queue() if shared else Queue.Queue()
+    _shared = shared
+    _pid = os.getpid()
+    _deliver = deliver
+    _global_bucket = TokenBucket(global_per_second, capacity = global_per_second)
+    _chat_rate = chat_per_second
+    _group_rate = group_per_minute / 60.0
+    _max_retries = max_retries
+
+    threads = [threading.Thread(target = _schedule)] + \
+              [threading.Thread(target = _send) for _ in range(senders)]
+
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    logger.info('Outbox started with {senders} senders'.format(senders = senders))
+
+    return
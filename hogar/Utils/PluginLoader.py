@@ -21,7 +21,9 @@
 # THE SOFTWARE.
 
 import imp
+import inspect
 import os
+import sys
 from hogar.static import values as static_values
 import logging
 
@@ -34,6 +36,22 @@ plugin_path = os.path.abspath(
 # A plugin will have its entypoint defined by the main.py file.
 plugin_enty = 'main'
 
+# Plugins that passed prepare_plugins() are kept loaded
+# here, keyed by their name. This way a plugin module is
+# executed once and not for every message it handles.
+loaded_plugins = {}
+
+# The modification times of the plugin entry points at
+# the time they were loaded, used to detect changes.
+loaded_mtimes = {}
+
+# Text plugins indexed by the commands they trigger for. Each
+# command maps to a tuple of the plugins to run, wildcard
+# plugins included, in the order they were loaded. Text
+# that matches no command runs only the wildcard plugins.
+command_index = {}
+wildcard_plugins = ()
+
 def get_plugins ():
     '''
         Get Plugins
@@ -64,66 +82,198 @@ def get_plugins ():
 
     return plugins
 
-def find_plugin (name):
+def load_plugin (plugin):
+    '''
+        Load a Plugin
+
+        Loads a plugin and returns an instance of it.
+
+        --
+        @param  plugin:tuple    A plugin discovered using imp.find_module
+
+        @return mixed
+    '''
+
+    try:
+        return imp.load_module(plugin['name'], *plugin['info'])
+
+    # Cleanup the open file caused by imp
+    finally:
+        fp = plugin['info'][0]
+        if fp:
+            fp.close()
+
+def takes_context (plugin):
+    '''
+        Takes Context
+
+        Check if the run() function of a plugin accepts a
+        context after the message. Plugins written before
+        contexts existed only take the message.
+
+        --
+        @param  plugin:module   The loaded plugin
+
+        @return bool
     '''
-        Find Plugin
 
-        Scans a directory and attempts to find a
-        specific plugin
+    try:
+        spec = inspect.getargspec(plugin.run)
+
+    except (AttributeError, TypeError):
+        return False
+
+    return len(spec.args) > 1 or spec.varargs is not None
+
+def index_commands (plugins):
+    '''
+        Index Commands
+
+        Builds a lookup of command to the text plugins that
+        should run for it, as well as the tuple of plugins
+        that run for any command.
 
         --
-        @param name:str     The name of the plugin to find
+        @param  plugins:list    The 'text' entries of a command_map
+
+        @return tuple
+    '''
+
+    wildcard = tuple(plugin for plugin in plugins if '*' in plugin['commands'])
+    index = {}
 
+    for command in set(c for plugin in plugins for c in plugin['commands'] if c != '*'):
+        index[command] = tuple(plugin for plugin in plugins \
+                               if command in plugin['commands'] or '*' in plugin['commands'])
+
+    return index, wildcard
+
+def get_mtimes ():
+    '''
+        Get Modification Times
+
+        Returns the modification times of every plugin
+        entry point on disk, keyed by plugin name.
+
+        --
         @return dict
     '''
 
-    logger.debug('Finding plugin {plugin}'.format(
-        plugin = name))
+    mtimes = {}
 
     for i in os.listdir(plugin_path):
 
-        if i == name:
-            location = os.path.join(plugin_path, i)
-            info = imp.find_module(plugin_enty, [location])
-            return {'name': i, 'info': info}
+        entry = os.path.join(plugin_path, i, plugin_enty + '.py')
 
-    return
+        try:
+            mtimes[i] = os.stat(entry).st_mtime
 
-def load_plugin (plugin):
+        except OSError:
+            continue
+
+    return mtimes
+
+def plugins_changed ():
     '''
-        Load a Plugin
+        Plugins Changed
 
-        Loads a plugin and returns an instance of it.
+        Check if any plugin was added, removed or
+        modified since plugins were last prepared.
 
         --
-        @param  plugin:tuple    A plugin discovered using imp.find_module
+        @return bool
+    '''
 
-        @return mixed
+    return get_mtimes() != loaded_mtimes
+
+def shutdown_plugins (plugins = None):
     '''
+        Shutdown Plugins
+
+        Call the optional shutdown() function of plugins,
+        giving them a chance to clean up before they are
+        unloaded or the process exits.
+
+        --
+        @param  plugins:dict    The plugins to shut down. Defaults
+                                to the loaded plugins.
+
+        @return None
+    '''
+
+    plugins = loaded_plugins if plugins is None else plugins
+
+    for name, plugin in plugins.items():
+
+        if not hasattr(plugin, 'shutdown'):
+            continue
+
+        try:
+            plugin.shutdown()
+
+        except Exception, e:
+            logger.error('Shutting down plugin {name} failed with: {error}'.format(
+                name = name, error = str(e)))
+
+    return
+
+def reload_plugins ():
+    '''
+        Reload Plugins
+
+        Discards the loaded plugins and prepares them
+        from disk again. Plugins are loaded into new module
+        objects, so anything still holding on to the old
+        ones will finish with them undisturbed. Should
+        preparing fail, the old plugins are kept.
+
+        --
+        @return dict
+    '''
+
+    logger.info('Reloading plugins from: {path}'.format(path = plugin_path))
+
+    # Move the current modules out of the way so that
+    # imp creates new ones instead of reusing them
+    previous = {}
+    for name in get_mtimes().keys():
+        if name in sys.modules:
+            previous[name] = sys.modules.pop(name)
+
+    previous_plugins = loaded_plugins
 
     try:
-        return imp.load_module(plugin['name'], *plugin['info'])
+        command_map = prepare_plugins()
 
-    # Cleanup the open file caused by imp
-    finally:
-        fp = plugin['info'][0]
-        if fp:
-            fp.close()
+    except Exception:
+
+        sys.modules.update(previous)
+        raise
+
+    shutdown_plugins(previous_plugins)
+
+    return command_map
 
 def prepare_plugins ():
     '''
         Prepare Plugins
 
         Orchestrates the search, prepare and error checking
-        of plugins for Hogar.
+        of plugins for Hogar. Plugins that pass are kept
+        loaded in loaded_plugins.
 
         --
         @return dict
     '''
 
+    # Record what is on disk before loading, so that
+    # changes made while we load are picked up later
+    plugins_mtimes = get_mtimes()
+
     # Prepare a dictionary of possible message
     # types that will have lists of plugins
     command_map = {message_type: [] for message_type in static_values.possible_message_types}
+    plugins_loaded = {}
 
     # Read all of the plugins out of the plugins directory
     plugins = get_plugins()
@@ -204,6 +354,20 @@ def prepare_plugins ():
                 plugin = plugin['name']
             ))
 
+        # Check the execution class, which decides the lane the
+        # plugin runs in. Plugins that don't specify one are
+        # assumed to wait on the network or database.
+        plugin_execution_class = static_values.default_execution_class
+        if hasattr(plugin_test, 'execution_class'):
+            plugin_execution_class = plugin_test.execution_class()
+
+            if plugin_execution_class not in static_values.execution_classes:
+                logger.error('Skipping plugin {name}. execution_class() should be one of: {classes}'.format(
+                    name = plugin['name'],
+                    classes = ', '.join(static_values.execution_classes)
+                ))
+                continue
+
         # Load up the plugin
         logger.debug('Loading plugin: {name}'.format(name = plugin['name']))
 
@@ -211,7 +375,20 @@ def prepare_plugins ():
         for message_type in plugin_applicable_types:
             command_map[message_type].append({
                 'name': plugin['name'],
-                'commands': plugin_commands
+                'commands': plugin_commands,
+                'execution_class': plugin_execution_class,
+                'context': takes_context(plugin_test)
             })
 
+        plugins_loaded[plugin['name']] = plugin_test
+
+    plugins_index, plugins_wildcard = index_commands(command_map['text'])
+
+    # Replace the loaded plugins with the newly prepared ones
+    global loaded_plugins, loaded_mtimes, command_index, wildcard_plugins
+    loaded_plugins = plugins_loaded
+    loaded_mtimes = plugins_mtimes
+    command_index = plugins_index
+    wildcard_plugins = plugins_wildcard
+
     return command_map
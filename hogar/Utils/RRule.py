@@ -0,0 +1,79 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Leon Jacobs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' Parsed RRULE cache '''
+
+from dateutil.rrule import rrulestr
+from hogar.Utils.Cache import TTLCache
+
+# Parsed rules, keyed by the rule text. Rules are only
+# parsed once and re-anchored when a next run is needed.
+_rules = TTLCache(max_size = 1024, ttl = None)
+
+def get_rule (rule):
+    '''
+        Get Rule
+
+        Returns the parsed rule for the rule text, parsing
+        it if it is not cached yet.
+
+        --
+        @param  rule:str    The RRULE text
+
+        @return rrule|rruleset
+    '''
+
+    parsed = _rules.get(rule)
+
+    if parsed is None:
+        parsed = rrulestr(rule)
+        _rules.set(rule, parsed)
+
+    return parsed
+
+def next_run (rule, now):
+    '''
+        Next Run
+
+        Returns the first occurrence of a rule after now.
+        Rules without their own DTSTART start at now.
+
+        --
+        @param  rule:str        The RRULE text
+        @param  now:datetime    The time to start from
+
+        @return datetime|None
+    '''
+
+    parsed = get_rule(rule)
+
+    # A DTSTART in the rule text takes precedence
+    # over the one we would otherwise give it
+    if 'DTSTART' in rule:
+        return parsed.after(now)
+
+    # Only single rules can be re-anchored. Anything
+    # else is parsed again with the new start.
+    if not hasattr(parsed, 'replace'):
+        return rrulestr(rule, dtstart = now).after(now)
+
+    return parsed.replace(dtstart = now).after(now)
@@ -0,0 +1,159 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Leon Jacobs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' Token bucket rate limiting '''
+
+import time
+
+class TokenBucket(object):
+    '''
+        A Token Bucket
+
+        Tokens are added at a fixed rate up to a capacity.
+        Every action consumes a token, so the long term
+        rate is capped while short bursts are allowed.
+        A bucket may also be paused until a given time,
+        during which it hands out no tokens at all.
+    '''
+
+    rate = None
+    capacity = None
+    tokens = None
+    updated = None
+    paused_until = 0
+
+    def __init__ (self, rate, capacity = 1):
+
+        '''
+            Prepare a new TokenBucket() instance.
+
+            --
+            @param  rate:float      Tokens added per second.
+            @param  capacity:int    The maximum tokens held.
+
+            @return None
+        '''
+
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.time()
+
+        return
+
+    def _refill (self, now):
+
+        '''
+            Refill
+
+            Add the tokens earned since the last refill.
+
+            --
+            @param  now:float   The current time.
+
+            @return None
+        '''
+
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        return
+
+    def wait_time (self, now = None):
+
+        '''
+            Wait Time
+
+            Returns the seconds until a token is available.
+
+            --
+            @param  now:float   The current time.
+
+            @return float
+        '''
+
+        now = now or time.time()
+        self._refill(now)
+
+        if self.paused_until > now:
+            return self.paused_until - now
+
+        if self.tokens >= 1:
+            return 0
+
+        return (1 - self.tokens) / self.rate
+
+    def consume (self, now = None):
+
+        '''
+            Consume
+
+            Take a token if one is available.
+
+            --
+            @param  now:float   The current time.
+
+            @return bool
+        '''
+
+        now = now or time.time()
+
+        if self.wait_time(now) > 0:
+            return False
+
+        self.tokens -= 1
+
+        return True
+
+    def pause (self, seconds):
+
+        '''
+            Pause
+
+            Hand out no tokens for the next amount of seconds.
+
+            --
+            @param  seconds:float   How long to pause for.
+
+            @return None
+        '''
+
+        self.paused_until = max(self.paused_until, time.time() + seconds)
+        self.tokens = 0
+
+        return
+
+    def is_idle (self, now = None):
+
+        '''
+            Is Idle
+
+            Check if the bucket is full and not paused, in
+            which case it behaves like a new bucket.
+
+            --
+            @param  now:float   The current time.
+
+            @return bool
+        '''
+
+        return self.wait_time(now) == 0 and self.tokens >= self.capacity
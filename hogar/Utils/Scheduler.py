@@ -20,9 +20,11 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-from multiprocessing import Pool
+import multiprocessing as mp
+import Queue
+import heapq
+from datetime import datetime
 from hogar.Jobs import Reminder
-import schedule
 import time
 import os
 import sys
@@ -30,28 +32,195 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-# The schedule package is pretty noisy. Reduce that.
-logging.getLogger('schedule').setLevel(logging.WARNING)
+# Reminders are reloaded from the database on this interval
+# in case a notification was missed. The parent pid is
+# checked at least as often as parent_check_interval.
+resync_interval = 300
+parent_check_interval = 5
 
-def scheduler_init (parent):
+# Queue the scheduler receives reminder changes on.
+# Created in boot() so that forked workers share it
+_queue = None
+
+def notify (kind, reminder_id, when):
+    '''
+        Notify
+
+        Tell the scheduler that a reminder was added, changed
+        or stopped. This is a noop if the scheduler has not
+        been booted.
+
+        --
+        @param  kind:str            Either 'once' or 'recurring'
+        @param  reminder_id:int     The id of the reminder
+        @param  when:datetime       The next time it should fire. None
+                                    if it should not fire again.
+
+        @return void
+    '''
+
+    if _queue is None:
+        return
+
+    _queue.put((kind, reminder_id, when))
+
+    return
+
+class ReminderHeap:
+    '''
+        Reminder Heap
+
+        A min-heap of reminder fire times. Changed or stopped
+        reminders leave their old entries in the heap, which
+        are skipped when popped.
+    '''
+
+    def __init__ (self):
+
+        self.heap = []
+        self.entries = {}
+
+    def load (self, reminders):
+        '''
+            Load
+
+            Replace the contents of the heap.
+
+            --
+            @param  reminders:list  (kind, id, when) tuples
+
+            @return void
+        '''
+
+        self.heap = []
+        self.entries = {}
+
+        for kind, reminder_id, when in reminders:
+            self.set(kind, reminder_id, when)
+
+        return
+
+    def set (self, kind, reminder_id, when):
+        '''
+            Set
+
+            Track a new fire time for a reminder, or stop
+            tracking it if when is None.
+
+            --
+            @param  kind:str            Either 'once' or 'recurring'
+            @param  reminder_id:int     The id of the reminder
+            @param  when:datetime       The next fire time
+
+            @return void
+        '''
+
+        key = (kind, reminder_id)
+
+        if when is None:
+            self.entries.pop(key, None)
+            return
+
+        if not isinstance(when, datetime):
+            logger.warning('Ignoring {kind} reminder {id} with an invalid time: {when}'.format(
+                kind = kind, id = reminder_id, when = when))
+            self.entries.pop(key, None)
+            return
+
+        self.entries[key] = when
+        heapq.heappush(self.heap, (when, key))
+
+        return
+
+    def next_time (self):
+        '''
+            Next Time
+
+            --
+            @return datetime|None
+        '''
+
+        while self.heap:
+            when, key = self.heap[0]
+
+            if self.entries.get(key) == when:
+                return when
+
+            # Stale entry
+            heapq.heappop(self.heap)
+
+        return None
+
+    def pop_due (self, now):
+        '''
+            Pop Due
+
+            Remove and return the kinds of all of the
+            reminders that are due.
+
+            --
+            @param  now:datetime    The current time
+
+            @return set
+        '''
+
+        due = set()
+
+        while self.heap and self.heap[0][0] <= now:
+            when, key = heapq.heappop(self.heap)
+
+            if self.entries.get(key) != when:
+                continue
+
+            del self.entries[key]
+            due.add(key[0])
+
+        return due
+
+def _run_due (reminders, now):
+    '''
+        Run Due
+
+        Run the reminder jobs for the kinds of reminders that
+        are due, tracking the next runs of recurring ones.
+
+        --
+        @param  reminders:ReminderHeap  The tracked reminders
+        @param  now:datetime            The current time
+
+        @return void
+    '''
+
+    due = reminders.pop_due(now)
+
+    if 'once' in due:
+        Reminder.run_remind_once()
+
+    if 'recurring' in due:
+        for reminder_id, next_run in Reminder.run_remind_recurring().items():
+            reminders.set('recurring', reminder_id, next_run)
+
+    return
+
+def scheduler_init (parent, queue):
     '''
         Schedule Init
 
-        Start the main loop for the internal scheduler that
-        ticks every second.
+        Start the main loop for the internal scheduler. It
+        sleeps until the next reminder is due, or until it
+        is notified of a change to the reminders.
 
         --
-        @param  parent:int  The PID of the parent.
+        @param  parent:int          The PID of the parent.
+        @param  queue:mp.Queue      The queue notifications arrive on
 
         @return void
     '''
 
-    # Define the jobs to run at which intervals
-    schedule.every().minute.do(Reminder.run_remind_once)
-    schedule.every().minute.do(Reminder.run_remind_recurring)
+    reminders = ReminderHeap()
+    reminders.load(Reminder.pending())
+    synced = time.time()
 
-    # Start the main thread, polling the schedules
-    # every second
     while True:
 
         # Check if the current parent pid matches the original
@@ -62,9 +231,31 @@ def scheduler_init (parent):
 
             sys.exit(1)
 
-        # Run the schedule
-        schedule.run_pending()
-        time.sleep(1)
+        if time.time() - synced >= resync_interval:
+            reminders.load(Reminder.pending())
+            synced = time.time()
+
+        _run_due(reminders, datetime.now())
+
+        # Sleep until the next reminder is due, waking
+        # up early when notified about a change
+        timeout = min(parent_check_interval, resync_interval - (time.time() - synced))
+        next_time = reminders.next_time()
+
+        if next_time is not None:
+            timeout = min(timeout, (next_time - datetime.now()).total_seconds())
+
+        try:
+            kind, reminder_id, when = queue.get(timeout = max(timeout, 0))
+            reminders.set(kind, reminder_id, when)
+
+            # Take whatever else has queued up
+            while True:
+                kind, reminder_id, when = queue.get_nowait()
+                reminders.set(kind, reminder_id, when)
+
+        except Queue.Empty:
+            pass
 
     return
 
@@ -80,10 +271,19 @@ def boot (ppid):
         @return None
     '''
 
-    pool = Pool(processes = 1)
-    logger.debug('Started scheduler pool with 1 process')
+    global _queue
+
+    # Processes forked after this share the queue
+    # so that they may notify the scheduler
+    _queue = mp.Queue()
+
+    # A plain process rather than a Pool, as a Pool's
+    # handler threads do not survive the gevent runtime
+    process = mp.Process(target = scheduler_init, args = (ppid, _queue))
+    process.daemon = True
+    process.start()
 
-    pool.apply_async(scheduler_init, args = (ppid,))
-    logger.debug('Started async scheduler_init()')
+    logger.debug('Started scheduler_init() in process {pid}'.format(
+        pid = process.pid))
 
     return
@@ -0,0 +1,276 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Leon Jacobs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' A parsed and cached snapshot of settings.ini '''
+
+import os
+import time
+import ConfigParser
+import logging
+
+logger = logging.getLogger(__name__)
+
+settings_file = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '../../settings.ini'))
+
+# The minimum amount of seconds between checks of the
+# settings file for changes
+check_interval = 1
+
+_snapshot = None
+_mtime = None
+_checked = 0
+
+class Section(object):
+    '''
+        A Settings Section
+
+        Read only access to the options of one section of
+        the settings snapshot. Options that are not set
+        return the default given for them.
+    '''
+
+    name = None
+    options = None
+
+    def __init__ (self, name, options):
+
+        '''
+            Prepare a new Section() instance.
+
+            --
+            @param  name:str        The name of the section.
+            @param  options:dict    The raw option values.
+
+            @return None
+        '''
+
+        self.name = name
+        self.options = options
+
+        return
+
+    def has (self, option):
+
+        '''
+            Has
+
+            Check if an option is set.
+
+            --
+            @param  option:str  The option name.
+
+            @return bool
+        '''
+
+        return option.lower() in self.options
+
+    def get (self, option, default = None):
+
+        '''
+            Get
+
+            --
+            @param  option:str      The option name.
+            @param  default:mixed   Returned when the option is not set.
+
+            @return str
+        '''
+
+        return self.options.get(option.lower(), default)
+
+    def getint (self, option, default = None):
+
+        '''
+            Get Int
+
+            --
+            @param  option:str      The option name.
+            @param  default:mixed   Returned when the option is not set.
+
+            @return int
+        '''
+
+        return int(self.options[option.lower()]) if self.has(option) else default
+
+    def getfloat (self, option, default = None):
+
+        '''
+            Get Float
+
+            --
+            @param  option:str      The option name.
+            @param  default:mixed   Returned when the option is not set.
+
+            @return float
+        '''
+
+        return float(self.options[option.lower()]) if self.has(option) else default
+
+    def getboolean (self, option, default = None):
+
+        '''
+            Get Boolean
+
+            Understands the same values as ConfigParser does.
+
+            --
+            @param  option:str      The option name.
+            @param  default:mixed   Returned when the option is not set.
+
+            @return bool
+        '''
+
+        if not self.has(option):
+            return default
+
+        value = self.options[option.lower()].lower()
+
+        if value not in ConfigParser.RawConfigParser._boolean_states:
+            raise ValueError('Not a boolean: {value}'.format(value = value))
+
+        return ConfigParser.RawConfigParser._boolean_states[value]
+
+def _split (value):
+    '''
+        Split
+
+        Split a comma seperated settings value into a
+        frozenset of its stripped, non empty parts.
+
+        --
+        @param  value:str   The value to split
+
+        @return frozenset
+    '''
+
+    return frozenset(x.strip() for x in value.split(',') if x.strip())
+
+def _parse ():
+    '''
+        Parse
+
+        Read the settings file and prepare the values
+        used on every message.
+
+        --
+        @return dict
+    '''
+
+    config = ConfigParser.ConfigParser()
+    config.read(settings_file)
+
+    acl_owners = _split(config.get('acl', 'owners'))
+    acl_users = _split(config.get('acl', 'users'))
+
+    return {
+        'config': config,
+        'sections': dict((name, Section(name, dict(config.items(name, raw = True))))
+                         for name in config.sections()),
+        'acl_enabled': config.getboolean('acl', 'enabled'),
+        'acl_owners': acl_owners,
+        'acl_users': acl_users,
+        'no_acl_plugins': _split(config.get('advanced', 'no_acl_plugins')) \
+            if config.has_option('advanced', 'no_acl_plugins') else frozenset()
+    }
+
+def reload ():
+    '''
+        Reload
+
+        Parse the settings file, replacing the current
+        snapshot.
+
+        --
+        @return dict
+    '''
+
+    global _snapshot, _mtime, _checked
+
+    try:
+        mtime = os.stat(settings_file).st_mtime
+
+    except OSError:
+        mtime = None
+
+    _snapshot = _parse()
+    _mtime = mtime
+    _checked = time.time()
+
+    logger.debug('Settings loaded from {file}'.format(file = settings_file))
+
+    return _snapshot
+
+def get ():
+    '''
+        Get
+
+        Returns the current settings snapshot. At most
+        once every check_interval seconds, the settings
+        file is checked and reloaded if it changed.
+
+        --
+        @return dict
+    '''
+
+    global _checked
+
+    if _snapshot is None:
+        return reload()
+
+    now = time.time()
+    if now - _checked < check_interval:
+        return _snapshot
+
+    _checked = now
+
+    try:
+        mtime = os.stat(settings_file).st_mtime
+
+    except OSError:
+        return _snapshot
+
+    if mtime != _mtime:
+        logger.info('Settings file changed. Reloading')
+        return reload()
+
+    return _snapshot
+
+def section (name):
+    '''
+        Section
+
+        Returns a section of the current settings snapshot.
+        Sections missing from the settings file are empty.
+
+        --
+        @param  name:str    The name of the section
+
+        @return Section
+    '''
+
+    sections = get()['sections']
+
+    if name not in sections:
+        return Section(name, {})
+
+    return sections[name]
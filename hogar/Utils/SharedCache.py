@@ -0,0 +1,243 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Leon Jacobs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' A cache shared between processes '''
+
+from hogar.static import values as static_values
+import cPickle as pickle
+import threading
+import sqlite3
+import time
+import os
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Connections are kept per thread, and are opened again
+# in processes forked after they were made
+_local = threading.local()
+
+class SharedCache(object):
+    '''
+        A Shared Cache
+
+        A size bounded cache where entries expire after a
+        time to live. Entries are kept in an SQLite database
+        in the data directory, so every worker process sees
+        the same entries. Once full, the entries closest to
+        expiring are evicted first.
+
+        Failing to use the database is logged and treated as
+        a cache miss, so a broken cache never breaks callers.
+    '''
+
+    name = None
+    max_size = None
+    ttl = None
+    path = None
+
+    def __init__ (self, name, max_size = 1024, ttl = 3600, path = None):
+
+        '''
+            Prepare a new SharedCache() instance.
+
+            --
+            @param  name:str        The name entries are kept under.
+            @param  max_size:int    The maximum amount of entries to keep.
+            @param  ttl:int         Seconds before an entry expires. None never expires.
+            @param  path:str        The database file. Defaults to the data directory.
+
+            @return None
+        '''
+
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path or os.path.join(static_values.data_dir, 'cache.sqlite.db')
+
+        return
+
+    def _connection (self):
+
+        '''
+            Connection
+
+            Returns the connection of this thread to the cache
+            database, preparing the database if needed.
+
+            --
+            @return sqlite3.Connection
+        '''
+
+        connections = getattr(_local, 'connections', None)
+
+        if connections is None or _local.pid != os.getpid():
+            connections = _local.connections = {}
+            _local.pid = os.getpid()
+
+        if self.path not in connections:
+
+            connection = sqlite3.connect(self.path, timeout = 5, isolation_level = None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS cache ('
+                               'name TEXT, key TEXT, value BLOB, expires REAL, '
+                               'PRIMARY KEY (name, key))')
+            connection.execute('CREATE INDEX IF NOT EXISTS cache_name_expires '
+                               'ON cache (name, expires)')
+
+            connections[self.path] = connection
+
+        return connections[self.path]
+
+    def get (self, key, default = None):
+
+        '''
+            Get
+
+            Returns the cached value for key, or default
+            if it is not cached or has expired.
+
+            --
+            @param  key:str         The key to look up.
+            @param  default:mixed   Returned when the key is not cached.
+
+            @return mixed
+        '''
+
+        try:
+            row = self._connection().execute(
+                'SELECT value, expires FROM cache WHERE name = ? AND key = ?',
+                (self.name, key)).fetchone()
+
+        except sqlite3.Error, e:
+            logger.error('Reading the {name} cache failed: {error}'.format(
+                name = self.name, error = str(e)))
+            return default
+
+        if row is None:
+            return default
+
+        value, expires = row
+
+        if expires is not None and expires < time.time():
+            return default
+
+        return pickle.loads(str(value))
+
+    def set (self, key, value, ttl = None):
+
+        '''
+            Set
+
+            Cache a value for key, evicting expired entries
+            and those closest to expiring if the cache
+            is full.
+
+            --
+            @param  key:str         The key to cache the value for.
+            @param  value:mixed     The value to cache. It should pickle.
+            @param  ttl:int         Seconds before it expires. Defaults to
+                                    the ttl of the cache.
+
+            @return None
+        '''
+
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires = now + ttl if ttl is not None else None
+
+        try:
+            connection = self._connection()
+            connection.execute('BEGIN IMMEDIATE')
+
+            try:
+                connection.execute(
+                    'INSERT OR REPLACE INTO cache (name, key, value, expires) VALUES (?, ?, ?, ?)',
+                    (self.name, key, sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)),
+                     expires))
+                connection.execute('DELETE FROM cache WHERE name = ? AND expires < ?',
+                                   (self.name, now))
+
+                size, = connection.execute('SELECT COUNT(*) FROM cache WHERE name = ?',
+                                           (self.name,)).fetchone()
+
+                if size > self.max_size:
+                    connection.execute(
+                        'DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache WHERE name = ? '
+                        'ORDER BY expires IS NULL, expires LIMIT ?)',
+                        (self.name, size - self.max_size))
+
+                connection.execute('COMMIT')
+
+            except:
+                connection.execute('ROLLBACK')
+                raise
+
+        except sqlite3.Error, e:
+            logger.error('Writing the {name} cache failed: {error}'.format(
+                name = self.name, error = str(e)))
+
+        return
+
+    def delete (self, key):
+
+        '''
+            Delete
+
+            Remove a key from the cache.
+
+            --
+            @param  key:str     The key to remove.
+
+            @return None
+        '''
+
+        try:
+            self._connection().execute('DELETE FROM cache WHERE name = ? AND key = ?',
+                                       (self.name, key))
+
+        except sqlite3.Error, e:
+            logger.error('Deleting from the {name} cache failed: {error}'.format(
+                name = self.name, error = str(e)))
+
+        return
+
+    def clear (self):
+
+        '''
+            Clear
+
+            Remove every entry of this cache.
+
+            --
+            @return None
+        '''
+
+        try:
+            self._connection().execute('DELETE FROM cache WHERE name = ?', (self.name,))
+
+        except sqlite3.Error, e:
+            logger.error('Clearing the {name} cache failed: {error}'.format(
+                name = self.name, error = str(e)))
+
+        return
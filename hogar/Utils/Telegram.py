@@ -21,10 +21,11 @@
 # THE SOFTWARE.
 
 import os
-import requests
 import urllib
 import ConfigParser
 from hogar.static import values as static_values
+from hogar.Utils import Http
+from hogar.Utils import Outbox
 import logging
 
 logger = logging.getLogger(__name__)
@@ -35,6 +36,26 @@ config.read(
 
 API_TOKEN = config.get('main', 'bot_access_token', '')
 
+# Older settings files may not have a [telegram] section
+POOL_SIZE = config.getint('telegram', 'pool_size') \
+    if config.has_option('telegram', 'pool_size') else 10
+TIMEOUT = config.getint('telegram', 'timeout') \
+    if config.has_option('telegram', 'timeout') else 30
+
+def client ():
+    '''
+        Client
+
+        Returns the pooled HTTP session of this process that
+        is used for every call to the Telegram API. Reusing
+        it keeps connections to the API alive between calls.
+
+        --
+        @return object
+    '''
+
+    return Http.session('telegram', pool_size = POOL_SIZE)
+
 def _nothing (recipient, message):
     '''
         Do Nothing(tm)
@@ -86,11 +107,11 @@ def _send_text_message (recipient, message):
         @param  recipient:dict  A dictionary of recipient information
         @param  message:str     The text to be sent
 
-        @return None
+        @return object
     '''
 
     # Send the request
-    requests.get(
+    return client().get(
         static_values.telegram_api_endpoint.format(
             token = API_TOKEN,
             method = 'sendMessage',
@@ -99,12 +120,9 @@ def _send_text_message (recipient, message):
                 'text': _truncate_text(_get_mention(recipient) + message).encode('utf-8')
             })
         ),
-        headers = static_values.headers,
-        verify = static_values.verify_ssl
+        timeout = TIMEOUT
     )
 
-    return
-
 def _send_photo_message (recipient, message, delete = True):
     '''
         Send a Photo Telegram message.
@@ -120,36 +138,39 @@ def _send_photo_message (recipient, message, delete = True):
         @param  recipient:dict  A dictionary of recipient information
         @param  message:dict    A dictionary with image information
 
-        @return None
+        @return object
     '''
 
-    requests.post(
-        static_values.telegram_api_endpoint.format(
-            token = API_TOKEN,
-            method = 'sendPhoto',
-            options = ''  # This is POST, so no options
-        ),
-        headers = static_values.headers,
-        verify = static_values.verify_ssl,
-        files = {
-            'photo': open(message['location'], 'rb')
-        },
-        data = {
-            'chat_id': recipient['id'],
-            'caption': _truncate_text(_get_mention(recipient) + message['caption']).encode('utf-8')
-        }
-    )
-
-    # We also need to clean up the photo from disk sometimes
-    if delete and 'no_image.png' not in message['location']:
+    with open(message['location'], 'rb') as photo:
+
+        response = client().post(
+            static_values.telegram_api_endpoint.format(
+                token = API_TOKEN,
+                method = 'sendPhoto',
+                options = ''  # This is POST, so no options
+            ),
+            timeout = TIMEOUT,
+            files = {
+                'photo': photo
+            },
+            data = {
+                'chat_id': recipient['id'],
+                'caption': _truncate_text(_get_mention(recipient) + message['caption']).encode('utf-8')
+            }
+        )
+
+    # We also need to clean up the photo from disk sometimes,
+    # but not while it may still be retried
+    if delete and 'no_image.png' not in message['location'] \
+            and not Outbox.retryable(response):
         logger.debug('Removing file: {file}'.format(file = message['location']))
         os.remove(message['location'])
 
-    return
+    return response
 
-def send_message (recipient, message_type, message):
+def deliver_message (recipient, message_type, message):
     '''
-        Send a Telegram Message.
+        Deliver a Telegram Message.
 
         This method takes the message_type argument
         and attempts to map it to the appropriate
@@ -160,7 +181,7 @@ def send_message (recipient, message_type, message):
         @param  message_type:str    The type of message to send
         @param  message:str         The message to be sent
 
-        @return None
+        @return object
     '''
 
     options = {
@@ -181,6 +202,28 @@ def send_message (recipient, message_type, message):
     ))
 
     # Run the appropriate function
-    options[message_type](recipient, message)
+    return options[message_type](recipient, message)
+
+def send_message (recipient, message_type, message):
+    '''
+        Send a Telegram Message.
+
+        If the outbox is running, the message is queued
+        for rate limited delivery. Otherwise it is
+        delivered right away.
+
+        --
+        @param  recipient:dict      A dictionary of recipient information
+        @param  message_type:str    The type of message to send
+        @param  message:str         The message to be sent
+
+        @return None
+    '''
+
+    if Outbox.running():
+        Outbox.put(recipient, message_type, message)
+        return
+
+    deliver_message(recipient, message_type, message)
 
     return
@@ -0,0 +1,71 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Leon Jacobs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+''' Split the text of a message into its command and arguments '''
+
+from collections import namedtuple
+import re
+
+# The parts of a message. The mention is a bot mentioned in
+# front of the command, the bot is the name Telegram adds to
+# commands in group chats as /command@bot_name.
+Tokens = namedtuple('Tokens', ['mention', 'command', 'bot', 'args'])
+
+# Matches the whole text in one pass. Only commands that
+# start with a '/' may have a bot name appended to them.
+_pattern = re.compile(r'''
+    \s*
+    (?:@(?P<mention>\S*)(?:\s+|$))?
+    (?:
+        /\s*(?P<slashed>[^\s@]*)(?:@(?P<bot>\S*))?
+        |
+        (?P<command>\S*)
+    )
+    \s*(?P<args>.*)
+''', re.VERBOSE | re.DOTALL | re.UNICODE)
+
+# The tokens of messages that are not text
+empty = Tokens(None, '', None, '')
+
+def tokenize (text):
+    '''
+        Tokenize
+
+        Parse the text of a message into the bot it mentions,
+        the lowercase command, the bot name appended to the
+        command and the arguments that follow it.
+
+        --
+        @param  text:str    The text of the message.
+
+        @return Tokens
+    '''
+
+    # Every part is optional, so any text matches
+    match = _pattern.match(text)
+
+    command = match.group('slashed')
+    if command is None:
+        command = match.group('command')
+
+    return Tokens(match.group('mention'), command.lower(),
+                  match.group('bot'), match.group('args').rstrip())
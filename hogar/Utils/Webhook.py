@@ -0,0 +1,193 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Leon Jacobs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import BaseHTTPServer
+import SocketServer
+import hmac
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The largest update body we are willing to read, in bytes
+max_body_size = 1024 * 1024
+
+class WebhookHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''
+        The Webhook Request Handler
+
+        Accepts update POSTs from Telegram and hands
+        them to the servers dispatcher.
+    '''
+
+    def _respond (self, code):
+
+        '''
+            Respond
+
+            Send an empty response with an HTTP status code.
+
+            --
+            @param  code:int    The HTTP status code to send
+
+            @return None
+        '''
+
+        self.send_response(code)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+        return
+
+    def do_POST (self):
+
+        '''
+            Handle a POST
+
+            Validate and parse an update and submit it to the
+            dispatcher. Telegram will retry updates that do not
+            get a 200 back, so we only answer once the update
+            is safely queued.
+
+            --
+            @return None
+        '''
+
+        if self.path != self.server.path:
+            logger.warning('Webhook POST to unknown path from {client}'.format(
+                client = self.client_address[0]))
+            self._respond(404)
+            return
+
+        # If we have a secret, Telegram sends it with every update.
+        # It is compared in constant time to not leak how much
+        # of a guess was right.
+        if self.server.secret and not hmac.compare_digest(
+                self.headers.getheader('X-Telegram-Bot-Api-Secret-Token', ''), self.server.secret):
+            logger.warning('Webhook POST with a bad secret from {client}'.format(
+                client = self.client_address[0]))
+            self._respond(403)
+            return
+
+        try:
+            length = int(self.headers.getheader('Content-Length', 0))
+
+        except ValueError:
+
+            logger.error('Webhook POST with a bad Content-Length from {client}'.format(
+                client = self.client_address[0]))
+            self._respond(400)
+            return
+
+        # Updates are small, so anything bigger is not read
+        if length < 0 or length > max_body_size:
+            logger.warning('Webhook POST of {length} bytes from {client} is too large'.format(
+                length = length, client = self.client_address[0]))
+            self._respond(413)
+            return
+
+        try:
+            update = json.loads(self.rfile.read(length).strip())
+
+        except ValueError, e:
+
+            logger.error('Parsing webhook Json failed with: {err}'.format(err = str(e)))
+            self._respond(400)
+            return
+
+        if not isinstance(update, dict) or 'update_id' not in update:
+            logger.error('Webhook POST did not contain an update')
+            self._respond(400)
+            return
+
+        logger.debug('Received update {id} via webhook'.format(id = update['update_id']))
+
+        self.server.dispatcher.submit(update)
+        self._respond(200)
+
+        return
+
+    def do_GET (self):
+
+        '''
+            Handle a GET
+
+            Only updates are accepted here.
+
+            --
+            @return None
+        '''
+
+        self._respond(405)
+
+        return
+
+    def log_message (self, format, *args):
+
+        '''
+            Log Message
+
+            Send the default request logging to our
+            logger instead of stderr.
+
+            --
+            @return None
+        '''
+
+        logger.debug('Webhook {client}: {message}'.format(
+            client = self.client_address[0],
+            message = format % args))
+
+        return
+
+class WebhookServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    '''
+        The Webhook Server
+
+        A threaded HTTP server that receives Telegram updates
+        and streams them to a Dispatcher.
+    '''
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__ (self, address, path, secret, dispatcher):
+
+        '''
+            Prepare a new WebhookServer() instance.
+
+            --
+            @param  address:tuple       The (host, port) to listen on.
+            @param  path:str            The path Telegram will POST to.
+            @param  secret:str          The secret token Telegram sends, if any.
+            @param  dispatcher:object   The started Dispatcher.
+
+            @return None
+        '''
+
+        self.path = path
+        self.secret = secret
+        self.dispatcher = dispatcher
+
+        BaseHTTPServer.HTTPServer.__init__(self, address, WebhookHandler)
+
+        return
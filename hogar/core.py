@@ -23,6 +23,7 @@
 __author__ = 'Leon Jacobs'
 
 import os
+import sys
 import logging
 import ConfigParser
 import requests
@@ -30,12 +31,21 @@ import urllib
 import json
 import traceback
 import time
-import multiprocessing as mp
+import signal
+import threading
 from datetime import datetime
 
 from hogar.static import values as static_values
 from hogar.Utils import Scheduler
 from hogar.Utils import Daemon
+from hogar.Utils import Webhook
+from hogar.Utils import PluginLoader
+from hogar.Utils import Settings
+from hogar.Utils import Telegram
+from hogar.Utils import Outbox
+from hogar.Utils.Dispatcher import Dispatcher
+from hogar.Utils.Dispatcher import GreenDispatcher
+from hogar.Utils.Dispatcher import LaneDispatcher
 from hogar import ResponseHandler
 
 # read the required configuration
@@ -45,7 +55,7 @@ config.read(
 
 logger = logging.getLogger(__name__)
 
-def response_handler (response, command_map):
+def response_handler (response, command_map, plugins = None):
     '''
         Response Handler
 
@@ -56,6 +66,8 @@ def response_handler (response, command_map):
         --
         @param  response:dict       The parsed Telegram response object.
         @param  command_map:dict    The parsed commands available.
+        @param  plugins:list        The names of the plugins to run. None
+                                    runs all of the applicable ones.
 
         @return None
     '''
@@ -65,7 +77,7 @@ def response_handler (response, command_map):
         logger.debug('Starting response_handler for update ID {id}'.format(
             id = response['update_id']))
 
-        handle = ResponseHandler.Response(response, command_map)
+        handle = ResponseHandler.Response(response, command_map, plugins)
         handle.run_plugins()
 
     except Exception, e:
@@ -87,6 +99,15 @@ class App(Daemon.Daemon):
     # Parsed plugins are mapped here
     command_map = None
 
+    # How updates are received. Either 'poll' or 'webhook'
+    ingestion = 'poll'
+
+    # The dispatcher that updates are handed to
+    dispatcher = None
+
+    # Set when a plugin reload was requested via a signal
+    reload_requested = None
+
     def set_command_map (self, command_map):
 
         '''
@@ -126,42 +147,360 @@ class App(Daemon.Daemon):
 
         return
 
+    def set_ingestion (self, ingestion):
+
+        '''
+            Set Ingestion
+
+            Mutator method to set how this Object
+            receives updates from Telegram
+
+            --
+            @param  ingestion:str   Either 'poll' or 'webhook'
+
+            @return None
+        '''
+
+        if ingestion not in ['poll', 'webhook']:
+            raise ValueError('Unknown ingestion mode: {mode}'.format(mode = ingestion))
+
+        self.ingestion = ingestion
+
+        return
+
     def run (self):
 
         '''
             The start of Hogar
 
-            This is the main entry point for Hogar. An infinite loop
-            is started to handle the long poll to the Telegram API.
-            Timeouts to the poll endpoint are considered ok and
-            a new connection will be made.
+            This is the main entry point for Hogar. The scheduler
+            and a long lived dispatcher are started, after which
+            updates are received either by long polling the
+            Telegram API or via the embedded webhook server.
 
-            Updates received from the endpoint will spawn async
-            update tasks for further processing, allowing for
-            a new long poll to happen.
+            Updates received are streamed to the dispatcher for
+            further processing, allowing for new updates to be
+            received while plugins run.
 
             --
             @return None
         '''
 
-        logger.debug('Setting up env for the long poller')
-
-        long_poll_time = config.getint('advanced', 'long_poll_time')
         api_token = config.get('main', 'bot_access_token', '')
-        last_request_id = 0
-        now = int(datetime.now().strftime('%s'))
-        last_poll_start = now
 
-        logger.info('Longpoll time is: {long_poll_time}'.format(
-            long_poll_time = long_poll_time))
+        # Older settings files may not have the dispatch
+        # options, so fall back to sane defaults
+        workers = config.getint('advanced', 'workers') \
+            if config.has_option('advanced', 'workers') else 4
+        queue_size = config.getint('advanced', 'queue_size') \
+            if config.has_option('advanced', 'queue_size') else 100
+        runtime = config.get('advanced', 'runtime') \
+            if config.has_option('advanced', 'runtime') else 'processes'
+        concurrency = config.getint('advanced', 'concurrency') \
+            if config.has_option('advanced', 'concurrency') else 1000
+        reload_interval = config.getint('advanced', 'plugin_reload_interval') \
+            if config.has_option('advanced', 'plugin_reload_interval') else 5
+
+        if runtime not in ['processes', 'gevent']:
+            raise ValueError('Unknown runtime: {runtime}'.format(runtime = runtime))
+
+        logger.info('Using the {runtime} runtime'.format(runtime = runtime))
 
         # Check that we know the bot access token
         if len(api_token) < 1:
             raise ValueError('Please define a Bot Access token in the settings file.')
 
+        # Start the outbox before anything that sends messages
+        # is forked, so that they all share its queue
+        if not config.has_option('telegram', 'outbox') or config.getboolean('telegram', 'outbox'):
+            self.start_outbox(shared = runtime != 'gevent')
+
         # Boot the scheduler.
         Scheduler.boot(os.getpid())
 
+        # Start the long lived dispatchers. Received updates
+        # are streamed to the workers of the lanes their plugins
+        # run in, or handled in greenlets when we are running
+        # with the gevent runtime
+        dispatcher = self.prepare_lanes(runtime, workers, queue_size, concurrency)
+        dispatcher.start()
+        self.dispatcher = dispatcher
+
+        # Watch for plugin changes on disk, as well as reload
+        # requests made with 'hogarctl.py reload'
+        self.reload_requested = threading.Event()
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.reload_requested.set())
+
+        # A SIGUSR2 reloads the settings snapshot everywhere. SIGHUP
+        # is left alone, as 'hogarctl.py stop' sends it to a daemon
+        # that does not exit on SIGTERM.
+        signal.signal(signal.SIGUSR2, lambda signum, frame: self.reload_settings())
+
+        watcher = threading.Thread(target = self.watch_plugins, args = (reload_interval,))
+        watcher.daemon = True
+        watcher.start()
+
+        if self.ingestion == 'webhook':
+            self.serve_webhook(dispatcher, api_token)
+        else:
+            self.long_poll(dispatcher, api_token)
+
+        return
+
+    def prepare_lanes (self, runtime, workers, queue_size, concurrency):
+
+        '''
+            Prepare Lanes
+
+            Prepare a dispatcher for every execution class
+            plugins may run in. The size of each lane is read
+            from the [lanes] section. The io lane defaults
+            to the workers or concurrency from [advanced].
+
+            --
+            @param  runtime:str         Either 'processes' or 'gevent'.
+            @param  workers:int         The default io lane worker processes.
+            @param  queue_size:int      The maximum updates waiting in a lane.
+            @param  concurrency:int     The default io lane concurrency.
+
+            @return object
+        '''
+
+        default_workers = {'fast': 1, 'io': workers, 'cpu': 1}
+        default_concurrency = {'fast': 100, 'io': concurrency, 'cpu': 10}
+
+        lanes = {}
+
+        for lane in static_values.execution_classes:
+
+            if runtime == 'gevent':
+                option = '{lane}_concurrency'.format(lane = lane)
+                lanes[lane] = GreenDispatcher(
+                    response_handler, self.command_map,
+                    concurrency = config.getint('lanes', option) \
+                        if config.has_option('lanes', option) else default_concurrency[lane])
+
+            else:
+                option = '{lane}_workers'.format(lane = lane)
+                lanes[lane] = Dispatcher(
+                    response_handler, self.command_map,
+                    workers = config.getint('lanes', option) \
+                        if config.has_option('lanes', option) else default_workers[lane],
+                    queue_size = queue_size)
+
+        return LaneDispatcher(lanes, ResponseHandler.route, self.command_map)
+
+    @staticmethod
+    def start_outbox (shared):
+
+        '''
+            Start Outbox
+
+            Start the rate limited delivery queue for outbound
+            messages with the options from the [telegram]
+            section.
+
+            --
+            @param  shared:bool     Share the queue with forked processes.
+
+            @return None
+        '''
+
+        options = {}
+        for option in ['senders', 'global_per_second', 'chat_per_second',
+                       'group_per_minute', 'max_retries']:
+            if config.has_option('telegram', option):
+                options[option] = config.getint('telegram', option)
+
+        Outbox.start(Telegram.deliver_message, shared = shared, **options)
+
+        return
+
+    def reload (self):
+
+        '''
+            Reload
+
+            Ask a running daemon to reload its plugins.
+
+            --
+            @return None
+        '''
+
+        pid = self.get_pid()
+
+        if not pid:
+            sys.stderr.write('pidfile %s does not exist. Not running?\n' % self.pidfile)
+            return
+
+        os.kill(pid, signal.SIGUSR1)
+
+        return
+
+    def reload_plugins (self):
+
+        '''
+            Reload Plugins
+
+            Prepare plugins from disk again and hand the new
+            command map to the dispatcher. If preparing fails,
+            the plugins already loaded are kept.
+
+            --
+            @return None
+        '''
+
+        try:
+            command_map = PluginLoader.reload_plugins()
+
+        except Exception, e:
+            logger.error('Reloading plugins failed, keeping the loaded ones: {error}'.format(
+                error = str(e)))
+            return
+
+        self.command_map = command_map
+        self.dispatcher.reload(command_map)
+
+        logger.info('Plugins reloaded')
+
+        return
+
+    def reload_settings (self):
+
+        '''
+            Reload Settings
+
+            Reload the settings snapshot of this process and
+            have the dispatcher do the same.
+
+            --
+            @return None
+        '''
+
+        logger.info('Settings reload requested')
+
+        Settings.reload()
+        self.dispatcher.reload_settings()
+
+        return
+
+    def watch_plugins (self, interval):
+
+        '''
+            Watch Plugins
+
+            Loops forever, reloading plugins when one changed
+            on disk or a reload was requested. An interval
+            of 0 disables checking the disk.
+
+            --
+            @param  interval:int    Seconds between checks of the disk.
+
+            @return None
+        '''
+
+        while True:
+
+            self.reload_requested.wait(interval if interval > 0 else None)
+
+            if self.reload_requested.is_set():
+                logger.info('Plugin reload requested')
+
+            elif interval > 0 and PluginLoader.plugins_changed():
+                logger.info('Plugin changes detected on disk')
+
+            else:
+                continue
+
+            self.reload_requested.clear()
+            self.reload_plugins()
+
+        return
+
+    def serve_webhook (self, dispatcher, api_token):
+
+        '''
+            Serve Webhook
+
+            Start the embedded HTTP server that Telegram will
+            POST updates to. If a public URL is configured, it
+            is registered with Telegram first.
+
+            --
+            @param  dispatcher:object   The started Dispatcher.
+            @param  api_token:str       The bots access token.
+
+            @return None
+        '''
+
+        # Settings files from before webhooks existed have
+        # no [webhook] section, so every option has a default
+        webhook = Settings.section('webhook')
+
+        listen = webhook.get('listen', '127.0.0.1')
+        port = webhook.getint('port', 8080)
+        path = webhook.get('path', '/hogar')
+        secret = webhook.get('secret', '')
+        url = webhook.get('url', '')
+
+        # Register the webhook with Telegram if we know
+        # where it should be reaching us
+        if len(url) > 0:
+
+            options = {'url': url}
+            if len(secret) > 0:
+                options['secret_token'] = secret
+
+            response = Telegram.client().get(
+                static_values.telegram_api_endpoint.format(
+                    token = api_token,
+                    method = 'setWebhook',
+                    options = urllib.urlencode(options)
+                ),
+                timeout = Telegram.TIMEOUT
+            )
+
+            if not response.status_code == requests.codes.ok:
+                raise ValueError('Registering the webhook failed. Server responded with HTTP code: {code}'.format(
+                    code = response.status_code))
+
+            logger.info('Registered webhook with Telegram')
+
+        server = Webhook.WebhookServer((listen, port), path, secret, dispatcher)
+
+        logger.info('Webhook server listening on {listen}:{port}{path}'.format(
+            listen = listen, port = port, path = path))
+
+        server.serve_forever()
+
+        return
+
+    def long_poll (self, dispatcher, api_token):
+
+        '''
+            Long Poll
+
+            An infinite loop is started to handle the long poll to
+            the Telegram API. Timeouts to the poll endpoint are
+            considered ok and a new connection will be made.
+
+            --
+            @param  dispatcher:object   The started Dispatcher.
+            @param  api_token:str       The bots access token.
+
+            @return None
+        '''
+
+        logger.debug('Setting up env for the long poller')
+
+        long_poll_time = config.getint('advanced', 'long_poll_time')
+        last_request_id = 0
+        now = int(datetime.now().strftime('%s'))
+        last_poll_start = now
+
+        logger.info('Longpoll time is: {long_poll_time}'.format(
+            long_poll_time = long_poll_time))
+
         # Start the main loop
         while True:
 
@@ -179,7 +518,7 @@ class App(Daemon.Daemon):
             try:
 
                 # Send the request
-                response = requests.get(
+                response = Telegram.client().get(
                     static_values.telegram_api_endpoint.format(
                         token = api_token,
                         method = 'getUpdates',
@@ -189,9 +528,7 @@ class App(Daemon.Daemon):
                             'timeout': long_poll_time
                         })
                     ),
-                    timeout = long_poll_time,
-                    headers = static_values.headers,
-                    verify = static_values.verify_ssl
+                    timeout = long_poll_time
                 )
 
                 logger.debug('Request was made to url: {url}'.format(
@@ -260,19 +597,10 @@ class App(Daemon.Daemon):
             last_request_id = max_request_id + 1 \
                 if ((max_request_id + 1) >= last_request_id) else last_request_id
 
-            # Start a response handler for every message received
-            # in the long poll. We make use of a pool that will
-            # handle only a few requests at a time
-            pool = mp.Pool(processes = 4)
-
-            # Add every message to the pool
+            # Hand every message received in the long poll to
+            # the dispatcher. Should the dispatch queue be
+            # full, this will block until workers catch up
             for message in response_data['result']:
-                # Pop a worker in the pool
-                pool.apply_async(response_handler,
-                                 args = (message, self.command_map,))
-
-            # Close and join the results.
-            pool.close()
-            pool.join()
+                dispatcher.submit(message)
 
         return
@@ -41,3 +41,7 @@ class values(object):
     possible_message_types = [
         'text', 'audio', 'document', 'photo', 'sticker', 'video', 'contact', 'location'
     ]
+    execution_classes = [
+        'fast', 'io', 'cpu'
+    ]
+    default_execution_class = 'io'
@@ -29,6 +29,18 @@ import sys
 import logging
 import ConfigParser
 
+# read the required configuration
+config = ConfigParser.ConfigParser()
+config.read(
+    os.path.join(os.path.dirname(__file__), 'settings.ini'))
+
+# The gevent runtime needs the standard library patched
+# before any of the network modules are imported
+if config.has_option('advanced', 'runtime') and config.get('advanced', 'runtime') == 'gevent':
+    from gevent import monkey
+
+    monkey.patch_all()
+
 from hogar.static import values as static_values
 from hogar.Utils import PluginLoader
 from hogar.Utils.DBUtils import DB
@@ -36,11 +48,6 @@ from hogar.Models.Base import db
 
 from hogar.core import App
 
-# read the required configuration
-config = ConfigParser.ConfigParser()
-config.read(
-    os.path.join(os.path.dirname(__file__), 'settings.ini'))
-
 # set up logging to file
 logging.basicConfig(
     level = logging.DEBUG,
@@ -124,8 +131,11 @@ if __name__ == '__main__':
             sys.exit(0)
 
         # The start of hogar as a daemon. Debug is used
-        # to keep the controlling terminal attached
-        elif sys.argv[1] == 'start' or sys.argv[1] == 'debug':
+        # to keep the controlling terminal attached. Webhook
+        # receives updates via the embedded HTTP server
+        # instead of long polling, and may be combined
+        # with debug as a second argument.
+        elif sys.argv[1] in ['start', 'debug', 'webhook']:
 
             qprint(' * Loading plugins...')
             command_map = PluginLoader.prepare_plugins()
@@ -142,8 +152,12 @@ if __name__ == '__main__':
             # of Hogar
             app.set_command_map(command_map)
 
+            if sys.argv[1] == 'webhook':
+                qprint(' * Using webhook ingestion')
+                app.set_ingestion('webhook')
+
             # Decide if we should daemonize or stay attached
-            if sys.argv[1] == 'start':
+            if 'debug' not in sys.argv:
 
                 qprint(' * Starting Daemon')
                 app.start()
@@ -161,10 +175,14 @@ if __name__ == '__main__':
         elif sys.argv[1] == 'stop':
             app.stop()
 
+        # Have a running app reload its plugins
+        elif sys.argv[1] == 'reload':
+            app.reload()
+
         else:
-            print ' * Supported arguments are: start|stop|restart|setupdb|debug'
+            print ' * Supported arguments are: start|stop|restart|reload|setupdb|debug|webhook'
             sys.exit(0)
 
     else:
-        print ' * Supported arguments are: start|stop|restart|setupdb|debug'
+        print ' * Supported arguments are: start|stop|restart|reload|setupdb|debug|webhook'
         sys.exit(1)